@@ -0,0 +1,95 @@
+import hashlib
+import mimetypes
+import os
+
+from flask import abort
+
+from compression import Encoded, respond
+
+# A year: fingerprinted URLs change whenever the content does
+FAR_FUTURE = 365 * 24 * 3600
+# Widths of the logo variants in static/; pages pick one with srcset
+LOGO_WIDTHS = (128, 256, 512)
+
+
+def fingerprinted(name, digest):
+    """'site.css' -> 'site.<digest>.css'."""
+    base, ext = os.path.splitext(name)
+    return f'{base}.{digest}{ext}'
+
+
+class StaticAssets:
+    """The files in the static folder, served under content-hashed names.
+
+    Everything is read once at startup. asset_url('site.css') in a template
+    gives /assets/site.<hash>.css, which is served from memory with a one-year
+    immutable Cache-Control: browsers fetch each asset once per change, and a
+    deploy that changes it changes the URL. Text assets are compressed at the
+    highest levels, once.
+    """
+
+    def __init__(self, folder, url_prefix='/assets'):
+        self.folder = folder
+        self.url_prefix = url_prefix
+        self._urls = {}
+        self._files = {}
+        if os.path.isdir(folder):
+            for root, _, files in os.walk(folder):
+                for filename in files:
+                    self._add(os.path.relpath(os.path.join(root, filename), folder).replace(os.sep, '/'))
+
+    def _add(self, name):
+        with open(os.path.join(self.folder, name), 'rb') as f:
+            body = f.read()
+        digest = hashlib.sha256(body).hexdigest()[:12]
+        content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        if content_type.startswith('text/'):
+            content_type += '; charset=utf-8'
+        served = fingerprinted(name, digest)
+        self._urls[name] = f'{self.url_prefix}/{served}'
+        self._files[served] = (Encoded(body, content_type, best=True), digest)
+
+    def init_app(self, app):
+        app.add_url_rule(f'{self.url_prefix}/<path:filename>', 'asset', self.serve)
+        app.jinja_env.globals['asset_url'] = self.url
+        app.jinja_env.globals['asset_srcset'] = self.srcset
+
+    def url(self, name):
+        return self._urls[name]
+
+    def srcset(self, pattern, widths=LOGO_WIDTHS):
+        """'logo-{}.png' -> 'logo-128.<hash>.png 128w, ...' for an <img srcset>."""
+        return ', '.join(f'{self.url(pattern.format(width))} {width}w' for width in widths)
+
+    def serve(self, filename):
+        entry = self._files.get(filename)
+        if entry is None:
+            abort(404)
+        response = respond(*entry)
+        response.cache_control.public = True
+        response.cache_control.max_age = FAR_FUTURE
+        response.cache_control.immutable = True
+        return response
+
+    def stats(self):
+        return {'assets': len(self._files), 'bytes': sum(len(encoded.body) for encoded, _ in self._files.values())}
+
+
+def build_logo_variants(source, folder, widths=LOGO_WIDTHS):
+    """Write a palette PNG logo-<width>.png for each width; return the paths."""
+    # Only needed when the logo changes, not to run the app
+    from PIL import Image
+
+    written = []
+    with Image.open(source) as image:
+        image.load()
+        for width in widths:
+            height = round(image.height * width / image.width)
+            variant = image.resize((width, height), Image.LANCZOS)
+            # A flat-colour logo loses nothing visible in a 256-colour
+            # palette, and the file is a third the size of a full-colour one
+            variant = variant.quantize(256, method=Image.Quantize.FASTOCTREE)
+            path = os.path.join(folder, f'logo-{width}.png')
+            variant.save(path, optimize=True)
+            written.append(path)
+    return written
@@ -0,0 +1,270 @@
+"""Benchmark the verifier against synthetic rosters.
+
+    python benchmark.py run --sizes 100 1000 10000 --plans 20 -o before.json
+    python benchmark.py compare before.json after.json
+
+Each roster size runs in a fresh process with its own medical.db, snapshot
+and journal in a temporary directory, so runs don't affect each other or the
+real database. Results are JSON: requests/s and p50/p95/p99 latency per
+scenario and size. Each read scenario also runs as <name>_cold, with the
+caches emptied before every request, so regressions in lookup and
+rendering show up even though the warm runs are mostly cache hits.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import quote
+
+SPECIALTIES = [
+    "Primary Care", "Dermatology (Skin)", "Nephrology (Kidney)", "Pediatrics",
+    "Ophthalmology (Eye)", "Podiatry (feet)", "Vascular (Veins)", "Cardiology (Heart)",
+    "Gastroenterology", "Family Practice", "Urology", "Endocrinology", "Neurology",
+    "Orthopedics", "Psychiatry", "Pulmonology", "Rheumatology", "Oncology",
+]
+FIRST_NAMES = ["Aaron", "Maria", "Robert", "Donzella", "Wei", "Priya", "Samuel", "Olga", "Kwame", "Lucia"]
+LAST_NAMES = ["Krinsky", "Dixon", "Grotas", "Pollack", "Weinstein", "Okafor", "Nguyen", "Haddad", "Rossi", "Kim"]
+CREDENTIALS = ["MD", "DO", "NP", "PA-C", "DPM"]
+
+
+def synthetic_directory(size, plans, seed=0):
+    """A doctors_data.json style roster of size doctors over plans plans."""
+    rng = random.Random(seed)
+    plan_names = [f"Plan {i:03d}" for i in range(plans)]
+    entries = []
+    for i in range(size):
+        name = f"Dr. {rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}-{i}, {rng.choice(CREDENTIALS)}"
+        entries.append({
+            "doctor": name,
+            "specialty": ', '.join(rng.sample(SPECIALTIES, rng.choice((1, 1, 1, 2)))),
+            "insurances": rng.sample(plan_names, rng.randint(1, min(plans, 8))),
+        })
+    return {"doctors_specialties": entries}
+
+
+def summarize(latencies, elapsed):
+    latencies = sorted(latencies)
+    cuts = statistics.quantiles(latencies, n=100, method='inclusive') if len(latencies) > 1 else latencies * 99
+    return {
+        'requests': len(latencies),
+        'throughput_rps': round(len(latencies) / elapsed, 1) if elapsed else None,
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 3),
+        'p50_ms': round(cuts[49] * 1000, 3),
+        'p95_ms': round(cuts[94] * 1000, 3),
+        'p99_ms': round(cuts[98] * 1000, 3),
+        'max_ms': round(latencies[-1] * 1000, 3),
+    }
+
+
+def scenarios(directory, rng):
+    """(name, method, factory, cold) where factory() returns the next request's (url, kwargs).
+
+    Cold scenarios empty the response and query caches before every timed
+    request, so they measure lookup and rendering rather than cache hits.
+    """
+    entries = directory['doctors_specialties']
+    plans = sorted({plan for entry in entries for plan in entry['insurances']})
+
+    def doctor():
+        return rng.choice(entries)['doctor']
+
+    def specialty():
+        return rng.choice(SPECIALTIES)
+
+    pages = [
+        ('query_page_insurance', lambda: ('/query_page', {'query_string': {'insurance_query': rng.choice(plans)}})),
+        ('query_page_doctor', lambda: ('/query_page', {'query_string': {'doctor_query': doctor()}})),
+        ('standalone_verify_specialty', lambda: ('/standalone_verify', {'query_string': {'specialty_query': specialty()}})),
+        ('management', lambda: ('/management', {})),
+        ('management_doctors_page', lambda: ('/api/management/doctors', {'query_string': {'offset': rng.randrange(len(entries))}})),
+        ('specialty', lambda: (f'/specialty/{quote(specialty())}', {})),
+    ]
+    writes = [
+        ('link', 'POST', lambda: ('/link', {'data': {'doctor': doctor(), 'insurance': rng.choice(plans)}}), False),
+        ('mass_link', 'POST', lambda: ('/mass_link', {'data': {
+            'insurance_name': rng.choice(plans),
+            'selected_doctors': [doctor() for _ in range(50)],
+        }}), False),
+    ]
+    return (
+        [(name, 'GET', factory, False) for name, factory in pages]
+        + [(name + '_cold', 'GET', factory, True) for name, factory in pages if name != 'management']
+        + writes
+    )
+
+
+def clear_caches(main):
+    """Forget every cached response and lookup; the directory stays loaded."""
+    main.page_cache.clear()
+    main.search_cache.clear()
+    main.query_engine.clear()
+    main.management_rows.cache_clear()
+    main.filtered_management_rows.cache_clear()
+
+
+def run_size(size, plans, requests, warmup, seed):
+    """Benchmark one roster size; runs inside the worker process."""
+    with open('doctors_data.json', 'w') as f:
+        json.dump(synthetic_directory(size, plans, seed), f)
+    start = time.perf_counter()
+    # Importing the app loads doctors_data.json into the empty database
+    import main
+    load_seconds = time.perf_counter() - start
+
+    client = main.app.test_client()
+    client.post('/login', data={'password': 'FMC8707$'})
+    with open('doctors_data.json') as f:
+        directory = json.load(f)
+    rng = random.Random(seed)
+
+    results = {'load_seconds': round(load_seconds, 3), 'scenarios': {}}
+    for name, method, factory, cold in scenarios(directory, rng):
+        call = client.get if method == 'GET' else client.post
+        for _ in range(warmup):
+            url, kwargs = factory()
+            call(url, **kwargs)
+        latencies = []
+        # Only time spent in requests counts towards throughput, not clearing
+        busy = 0.0
+        for _ in range(requests):
+            url, kwargs = factory()
+            if cold:
+                clear_caches(main)
+            t = time.perf_counter()
+            response = call(url, **kwargs)
+            response.get_data()
+            latencies.append(time.perf_counter() - t)
+            busy += latencies[-1]
+            if response.status_code >= 400:
+                raise RuntimeError(f"{name}: {url} returned {response.status_code}")
+        results['scenarios'][name] = summarize(latencies, busy)
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run(args):
+    here = os.path.dirname(os.path.abspath(__file__))
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'plans': args.plans,
+            'requests': args.requests,
+            'warmup': args.warmup,
+            'seed': args.seed,
+        },
+        'sizes': {},
+    }
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory(prefix='fmc-bench-') as workdir:
+            env = dict(
+                os.environ,
+                PYTHONPATH=os.pathsep.join(filter(None, [here, os.environ.get('PYTHONPATH')])),
+                DATABASE_URL='sqlite:///' + os.path.join(workdir, 'medical.db'),
+                DIRECTORY_SNAPSHOT=os.path.join(workdir, 'directory.snapshot'),
+                DIRECTORY_JOURNAL=os.path.join(workdir, 'directory.journal'),
+                AUTH_SESSION_BACKEND='memory',
+            )
+            env.pop('JOURNAL_COMPACT_INTERVAL', None)
+            out = os.path.join(workdir, 'result.json')
+            print(f"Benchmarking {size} doctors x {args.plans} plans...", file=sys.stderr)
+            subprocess.run([
+                sys.executable, os.path.abspath(__file__), 'worker',
+                '--size', str(size), '--plans', str(args.plans), '--requests', str(args.requests),
+                '--warmup', str(args.warmup), '--seed', str(args.seed), '--out', out,
+            ], cwd=workdir, env=env, check=True)
+            with open(out) as f:
+                report['sizes'][str(size)] = json.load(f)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    print(text)
+
+
+def worker(args):
+    results = run_size(args.size, args.plans, args.requests, args.warmup, args.seed)
+    with open(args.out, 'w') as f:
+        json.dump(results, f)
+
+
+def compare(args):
+    """Print p50/p95/p99 changes; exit 1 if any grew by more than the threshold."""
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    regressions = 0
+    print(f"{'size':>7} {'scenario':<30} {'metric':<7} {'before':>10} {'after':>10} {'change':>8}")
+    for size, result in candidate['sizes'].items():
+        before_scenarios = baseline['sizes'].get(size, {}).get('scenarios', {})
+        for name, after in result['scenarios'].items():
+            before = before_scenarios.get(name)
+            if before is None:
+                continue
+            for metric in ('p50_ms', 'p95_ms', 'p99_ms'):
+                change = (after[metric] - before[metric]) / before[metric] if before[metric] else 0.0
+                flag = ''
+                if change > args.threshold:
+                    regressions += 1
+                    flag = '  REGRESSION'
+                print(f"{size:>7} {name:<30} {metric[:-3]:<7} {before[metric]:>10.3f} {after[metric]:>10.3f} {change:>+8.1%}{flag}")
+    if regressions:
+        print(f"{regressions} metrics regressed by more than {args.threshold:.0%}", file=sys.stderr)
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='benchmark one or more roster sizes')
+    run_parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 10000])
+    run_parser.add_argument('--plans', type=int, default=20, help='insurance plans in the roster')
+    run_parser.add_argument('--requests', type=int, default=200, help='timed requests per scenario')
+    run_parser.add_argument('--warmup', type=int, default=10, help='untimed requests per scenario')
+    run_parser.add_argument('--seed', type=int, default=0)
+    run_parser.add_argument('-o', '--output', help='also write the JSON report here')
+    run_parser.set_defaults(handler=run)
+
+    worker_parser = commands.add_parser('worker', help=argparse.SUPPRESS)
+    worker_parser.add_argument('--size', type=int, required=True)
+    worker_parser.add_argument('--plans', type=int, required=True)
+    worker_parser.add_argument('--requests', type=int, required=True)
+    worker_parser.add_argument('--warmup', type=int, required=True)
+    worker_parser.add_argument('--seed', type=int, required=True)
+    worker_parser.add_argument('--out', required=True)
+    worker_parser.set_defaults(handler=worker)
+
+    compare_parser = commands.add_parser('compare', help='compare two reports')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('candidate')
+    compare_parser.add_argument('--threshold', type=float, default=0.10,
+                                help='relative slowdown that counts as a regression')
+    compare_parser.set_defaults(handler=compare)
+
+    args = parser.parse_args()
+    args.handler(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+import gzip
+
+from flask import Response, request
+
+try:
+    import brotli
+except ImportError:  # Optional: without it everything is served gzipped
+    brotli = None
+
+# Below this the headers outweigh the savings
+MIN_SIZE = 512
+COMPRESSIBLE_TYPES = ('text/', 'application/json', 'application/javascript', 'image/svg+xml')
+
+
+def encodings():
+    """Content codings we can produce, preferred first."""
+    return ('br', 'gzip') if brotli else ('gzip',)
+
+
+def compress(body, encoding, best=False):
+    # best is for bodies compressed once at startup; pages compressed on a
+    # cache miss use levels that stay in the low milliseconds
+    if encoding == 'br':
+        return brotli.compress(body, quality=11 if best else 5)
+    return gzip.compress(body, 9 if best else 6, mtime=0)
+
+
+class Encoded:
+    """A response body and its compressed forms, each made on first use."""
+
+    def __init__(self, body, content_type, best=False):
+        self.body = body
+        self.content_type = content_type
+        self.best = best
+        self.compressible = len(body) >= MIN_SIZE and content_type.startswith(COMPRESSIBLE_TYPES)
+        self._encoded = {}
+
+    def negotiate(self, accept_encodings):
+        """The coding to send for the client's Accept-Encoding, or None."""
+        if not self.compressible:
+            return None
+        encoding = accept_encodings.best_match(encodings())
+        # Not worth sending if it didn't shrink
+        return encoding if encoding and self.get(encoding) is not self.body else None
+
+    def get(self, encoding=None):
+        if encoding is None:
+            return self.body
+        data = self._encoded.get(encoding)
+        if data is None:
+            data = compress(self.body, encoding, self.best)
+            if len(data) >= len(self.body):
+                data = self.body
+            self._encoded[encoding] = data
+        return data
+
+
+def respond(encoded, etag):
+    """A 200, or 304 if the client has it, for the current request.
+
+    Each coding is a different representation, so it gets its own ETag.
+    """
+    encoding = encoded.negotiate(request.accept_encodings)
+    if encoding:
+        etag = f'{etag}-{encoding}'
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = Response(encoded.get(encoding), content_type=encoded.content_type)
+        if encoding:
+            response.content_encoding = encoding
+    response.set_etag(etag)
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def compress_response(response):
+    """after_request hook compressing text responses that weren't cached.
+
+    Cached ones are already encoded; streamed ones (the CSV export) are
+    left alone.
+    """
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers):
+        return response
+    encoded = Encoded(response.get_data(), response.content_type)
+    if encoded.compressible:
+        response.vary.add('Accept-Encoding')
+        encoding = encoded.negotiate(request.accept_encodings)
+        if encoding:
+            response.set_data(encoded.get(encoding))
+            response.content_encoding = encoding
+    return response
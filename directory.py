@@ -0,0 +1,179 @@
+import threading
+from functools import cached_property
+
+from search import TypeaheadIndex
+from taxonomy import SpecialtyTaxonomy
+
+
+class DirectoryIndex:
+    """Lookup maps over one version of the directory.
+
+    Each posting list holds the ready-to-render result dicts used by the verify
+    pages, so a search costs a dictionary lookup plus the size of the result.
+    """
+
+    def __init__(self, data):
+        self.data = data
+        self.by_doctor = {}
+        self.by_insurance = {}
+        self.by_specialty = {}
+        self._doctor_specialties = {}
+        self._doctor_insurances = {}
+        self._doctor_colors = {}
+        # Row-level view of the same postings, for intersecting criteria
+        self._matches = []
+        self._row_keys = []
+        self._rows = {'doctor': {}, 'insurance': {}, 'specialty': {}}
+        for row, entry in enumerate(data['doctors_specialties']):
+            insurances = entry.get('insurances', [])
+            match = {
+                'name': entry['doctor'],
+                'specialties': entry['specialty'],
+                'insurances': ', '.join(insurances)
+            }
+            self._matches.append(match)
+            self.by_doctor.setdefault(entry['doctor'], []).append(match)
+            self._rows['doctor'].setdefault(entry['doctor'], []).append(row)
+            self._doctor_insurances.setdefault(entry['doctor'], set()).update(insurances)
+            for ins in dict.fromkeys(insurances):
+                self.by_insurance.setdefault(ins, []).append(match)
+                self._rows['insurance'].setdefault(ins, []).append(row)
+            specs = entry['specialty'].split(', ') if entry['specialty'] else []
+            self._doctor_specialties.setdefault(entry['doctor'], []).append(specs)
+            for spec in dict.fromkeys(specs):
+                self.by_specialty.setdefault(spec, []).append(match)
+                self._rows['specialty'].setdefault(spec, []).append(row)
+            self._row_keys.append({
+                'doctor': (entry['doctor'],),
+                'insurance': frozenset(insurances),
+                'specialty': frozenset(specs)
+            })
+        self.doctors = list(self.by_doctor)
+        self.insurances = list(self.by_insurance)
+
+    def accepts(self, doctor, insurance):
+        return insurance in self._doctor_insurances.get(doctor, ())
+
+    def rows(self, field, name):
+        """Row numbers of the entries whose field ('doctor', 'insurance' or
+        'specialty') includes name, in directory order."""
+        return self._rows[field].get(name, ())
+
+    def row_has(self, row, field, name):
+        return name in self._row_keys[row][field]
+
+    def match(self, row):
+        return self._matches[row]
+
+    @cached_property
+    def taxonomy(self):
+        names = list(self.data['specialties']) + list(self.by_specialty)
+        return SpecialtyTaxonomy(names, {name: len(self.rows('specialty', name)) for name in dict.fromkeys(names)})
+
+    @cached_property
+    def typeahead(self):
+        # Built on the first search of each directory version
+        return TypeaheadIndex(
+            [('doctor', name) for name in self.doctors]
+            + [('insurance', name) for name in self.data['insurances']]
+            + [('specialty', name) for name in self.data['specialties']]
+        )
+
+    def _doctor_specialty_lists(self):
+        return self._doctor_specialties.items()
+
+    def doctor_colors(self, specialties):
+        """Return the doctor-grid color classes for the given specialty list.
+
+        Gives ({doctor: css class}, [(css class, hues)]). A doctor is colored
+        by the 1-based positions of their specialties in the list, so the
+        result is computed once per directory version and specialty list.
+        """
+        key = tuple(specialties)
+        colors = self._doctor_colors.get(key)
+        if colors is None:
+            classes = {}
+            styles = {}
+            for doctor, spec_lists in self._doctor_specialty_lists():
+                positions = [
+                    i for specs in spec_lists
+                    for i, spec in enumerate(specialties, 1) if spec in specs
+                ]
+                if len(positions) in (1, 2):
+                    class_name = 'doctor-' + '-'.join(map(str, positions))
+                    styles[class_name] = [(i * 37) % 360 for i in positions]
+                else:
+                    class_name = ''
+                classes[doctor] = class_name
+            colors = self._doctor_colors[key] = (classes, list(styles.items()))
+        return colors
+
+
+class ProviderDirectory:
+    """Process-wide, in-memory copy of the provider directory.
+
+    load() builds the directory from the backing store once and the result is
+    kept in memory. It is only rebuilt when signature() changes (a commit in
+    this process, or another worker's commit touching the database file) or
+    after invalidate().
+    """
+
+    def __init__(self, load, signature):
+        self._load_data = load
+        self._signature_of = signature
+        self._lock = threading.Lock()
+        self._data = None
+        self._signature = None
+        self._counted = None
+        self._index = None
+        self.version = 0
+        self.hits = 0
+        self.reloads = 0
+
+    def get(self):
+        signature = self._signature_of()
+        if self._data is not None and signature == self._signature:
+            self._count_hit(signature)
+            return self._data
+        with self._lock:
+            if self._data is None or signature != self._signature:
+                self._data = self._load_data()
+                self._signature = self._counted = signature
+                self.version += 1
+                self.reloads += 1
+            else:
+                self._count_hit(signature)
+            return self._data
+
+    def _count_hit(self, signature):
+        # signature() hands back the same object for the whole of a web
+        # request, which counts as one hit however often it reads the data
+        if signature is not self._counted:
+            self._counted = signature
+            self.hits += 1
+
+    def current_version(self):
+        self.get()
+        return self.version
+
+    def index(self):
+        data = self.get()
+        index = self._index
+        if index is None or index.data is not data:
+            # Snapshots carry their own prebuilt indexes
+            index = self._index = getattr(data, 'prebuilt_index', None) or DirectoryIndex(data)
+        return index
+
+    def invalidate(self):
+        with self._lock:
+            self._data = None
+            self._signature = None
+
+    def stats(self):
+        data = self._data
+        return {
+            'version': self.version,
+            'hits': self.hits,
+            'reloads': self.reloads,
+            'entries': len(data['doctors_specialties']) if data else 0,
+        }
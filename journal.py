@@ -0,0 +1,77 @@
+import json
+import os
+import time
+from datetime import datetime, timezone
+
+from storage import file_lock
+
+
+class Journal:
+    """Append-only log of directory changes, one JSON object per line.
+
+    Every entry is written at the end of the file, so recording a change costs
+    the same however large the directory is. An entry's position is its byte
+    offset; readers remember the offset after the last entry they saw and
+    resume from there, which is how replicas and caches catch up. The log is
+    never rewritten, so it doubles as the audit trail.
+    """
+
+    def __init__(self, path, fsync=False):
+        self.path = path
+        self.fsync = fsync
+
+    def append(self, op, **fields):
+        """Record one change; return the offset it was written at."""
+        entry = {'ts': datetime.now(timezone.utc).isoformat(timespec='milliseconds'), 'op': op}
+        entry.update(fields)
+        line = json.dumps(entry, separators=(',', ':')).encode('utf-8') + b'\n'
+        with file_lock(self.path):
+            with open(self.path, 'ab') as f:
+                offset = f.tell()
+                f.write(line)
+                f.flush()
+                if self.fsync:
+                    os.fsync(f.fileno())
+        return offset
+
+    def end(self):
+        try:
+            return os.path.getsize(self.path)
+        except FileNotFoundError:
+            return 0
+
+    def is_boundary(self, offset):
+        """Whether offset is where an entry starts, or the end of the journal."""
+        if offset == 0:
+            return True
+        if not 0 < offset <= self.end():
+            return False
+        with open(self.path, 'rb') as f:
+            f.seek(offset - 1)
+            return f.read(1) == b'\n'
+
+    def read(self, after=0, limit=None):
+        """Yield (offset, next offset, entry) for the entries from offset after on.
+
+        A line still being written has no trailing newline yet and is left for
+        the next read.
+        """
+        try:
+            f = open(self.path, 'rb')
+        except FileNotFoundError:
+            return
+        with f:
+            f.seek(after)
+            offset = after
+            for count, line in enumerate(f):
+                if limit is not None and count >= limit or not line.endswith(b'\n'):
+                    return
+                yield offset, offset + len(line), json.loads(line)
+                offset += len(line)
+
+    def tail(self, after=0, poll=1.0):
+        """Like read(), but keep waiting for new entries."""
+        while True:
+            for offset, after, entry in self.read(after):
+                yield offset, after, entry
+            time.sleep(poll)
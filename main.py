@@ -1,22 +1,62 @@
-from flask import Flask, render_template_string, request, redirect, url_for, session
+from flask import Flask, Response, g, has_request_context, render_template, request, redirect, url_for
 from flask_sqlalchemy import SQLAlchemy
-from functools import wraps
+from functools import lru_cache, wraps
+from jinja2 import DictLoader
 from datetime import timedelta, datetime
 from flask import jsonify
-
+from assets import StaticAssets, build_logo_variants
+from compression import compress_response
+from directory import ProviderDirectory
+from journal import Journal
+from metrics import RequestMetrics
+from query import Criteria, QueryEngine
+from response_cache import ResponseCache
+from roster import RosterError, diff_roster, iter_roster
+from sessions import MemorySessionStore, SQLiteSessionStore
+from snapshot import DirectorySnapshot, write_snapshot
+from storage import atomic_write_json
+from sqlalchemy import event
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+
+import click
+import csv
+import json
 import os
+import threading
+import time
 
 app = Flask(__name__)
-app.secret_key = 'FMC8707$-secret-key-789'  # Required for sessions
-app.permanent_session_lifetime = timedelta(seconds=60)  # Session timeout after 60 seconds
+app.secret_key = 'FMC8707$-secret-key-789'
+# Logins are kept server side; a session ends after this long without a request
+app.config['AUTH_SESSION_IDLE'] = timedelta(minutes=int(os.environ.get('AUTH_SESSION_IDLE_MINUTES', 30)))
+# 'sqlite' shares sessions between workers; 'memory' is for a single process
+app.config['AUTH_SESSION_BACKEND'] = os.environ.get('AUTH_SESSION_BACKEND', 'sqlite')
+app.config['AUTH_SESSION_COOKIE'] = 'fmc_auth'
 
 # Create instance directory if it doesn't exist
 os.makedirs('instance', exist_ok=True)
 
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///medical.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///medical.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Memory-mapped directory snapshot shared by all workers; set to '' to disable
+app.config['DIRECTORY_SNAPSHOT'] = os.environ.get(
+    'DIRECTORY_SNAPSHOT', os.path.join(app.instance_path, 'directory.snapshot'))
+# Append-only log of every change, for audit and for replicas to tail; '' disables
+app.config['DIRECTORY_JOURNAL'] = os.environ.get(
+    'DIRECTORY_JOURNAL', os.path.join(app.instance_path, 'directory.journal'))
 db = SQLAlchemy(app)
 
+# Latency, phase timings, response sizes and SQL counts, served on /metrics
+request_metrics = RequestMetrics()
+request_metrics.init_app(app)
+
+# CSS and logos under content-hashed URLs with far-future caching
+static_assets = StaticAssets(app.static_folder)
+static_assets.init_app(app)
+# Responses that didn't come gzipped from a cache are compressed on the way out
+app.after_request(compress_response)
+
 class Doctor(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), unique=True, nullable=False)
@@ -31,27 +71,506 @@ class DoctorInsurance(db.Model):
     insurance_id = db.Column(db.Integer, db.ForeignKey('insurance.id'), nullable=False)
     doctor = db.relationship('Doctor', backref=db.backref('insurances', lazy=True))
     insurance = db.relationship('Insurance', backref=db.backref('doctors', lazy=True))
+    __table_args__ = (
+        db.Index('ix_doctor_insurance_pair', 'doctor_id', 'insurance_id', unique=True),
+        db.Index('ix_doctor_insurance_insurance', 'insurance_id'),
+    )
 
 class Specialty(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), unique=True, nullable=False)
 
 class DoctorSpecialty(db.Model):
-    id = db.Column(db.Integer, db.ForeignKey('doctor.id'), nullable=False)
+    id = db.Column(db.Integer, primary_key=True)
+    doctor_id = db.Column(db.Integer, db.ForeignKey('doctor.id'), nullable=False)
     specialty_id = db.Column(db.Integer, db.ForeignKey('specialty.id'), nullable=False)
     doctor = db.relationship('Doctor', backref=db.backref('specialties', lazy=True))
     specialty = db.relationship('Specialty', backref=db.backref('doctors', lazy=True))
+    __table_args__ = (
+        db.Index('ix_doctor_specialty_pair', 'doctor_id', 'specialty_id', unique=True),
+        db.Index('ix_doctor_specialty_specialty', 'specialty_id'),
+    )
 
-with app.app_context():
+class DataImport(db.Model):
+    # One row per seed file imported, so the startup import only ever runs once
+    source = db.Column(db.String(255), primary_key=True)
+    imported_at = db.Column(db.DateTime, nullable=False, default=datetime.now)
+
+def create_tables():
     db.create_all()
+    # create_all() skips indexes on tables that already exist
+    for model in (DoctorInsurance, DoctorSpecialty):
+        for index in model.__table__.indexes:
+            index.create(db.engine, checkfirst=True)
+
+with app.app_context():
+    create_tables()
+
+# Bumped on every commit in this process; the file signature catches commits
+# made by other workers.
+database_commits = 0
+
+@event.listens_for(db.session, 'after_commit')
+def count_commit(session):
+    global database_commits
+    database_commits += 1
+
+def database_file_signature():
+    try:
+        with open(db.engine.url.database, 'rb') as f:
+            header = f.read(28)
+            st = os.fstat(f.fileno())
+    except FileNotFoundError:
+        return None
+    # Bytes 24-27 of the SQLite header are the file change counter, bumped by
+    # every committed write even when mtime/size don't move
+    return (st.st_mtime_ns, st.st_size, int.from_bytes(header[24:28], 'big'))
+
+def database_version():
+    # The file is checked once per request; a commit in this process during
+    # the request (its own included) moves the counter and checks it again
+    if not has_request_context():
+        return (database_commits, database_file_signature())
+    version = g.get('database_version')
+    if version is None or version[0] != database_commits:
+        version = g.database_version = (database_commits, database_file_signature())
+    return version
+
+journal = Journal(app.config['DIRECTORY_JOURNAL']) if app.config['DIRECTORY_JOURNAL'] else None
+
+def record_change(op, **fields):
+    """Append a committed change to the journal."""
+    if journal is not None:
+        source = request.remote_addr if has_request_context() else 'cli'
+        journal.append(op, source=source, **fields)
+
+def journal_end():
+    return journal.end() if journal is not None else 0
+
+def load_directory():
+    # One indexed join per relation instead of walking lazy relationships
+    specialties = {}
+    for doctor_id, name in db.session.execute(
+            db.select(DoctorSpecialty.doctor_id, Specialty.name)
+            .join(Specialty, DoctorSpecialty.specialty_id == Specialty.id)
+            .order_by(DoctorSpecialty.id)):
+        specialties.setdefault(doctor_id, []).append(name)
+    insurances = {}
+    for doctor_id, name in db.session.execute(
+            db.select(DoctorInsurance.doctor_id, Insurance.name)
+            .join(Insurance, DoctorInsurance.insurance_id == Insurance.id)
+            .order_by(DoctorInsurance.id)):
+        insurances.setdefault(doctor_id, []).append(name)
+
+    entries = [
+        {
+            "doctor": name,
+            "specialty": ', '.join(specialties.get(doctor_id, [])),
+            "insurances": insurances.get(doctor_id, [])
+        }
+        for doctor_id, name in db.session.execute(db.select(Doctor.id, Doctor.name).order_by(Doctor.id))
+    ]
+    return {
+        "doctors_specialties": entries,
+        "insurances": db.session.scalars(db.select(Insurance.name).order_by(Insurance.id)).all(),
+        "specialties": db.session.scalars(db.select(Specialty.name).order_by(Specialty.id)).all()
+    }
+
+def chunked(items, size=500):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def insert_names(model, names):
+    """Insert the names that don't exist yet; return how many were new."""
+    inserted = 0
+    for chunk in chunked(dict.fromkeys(names)):
+        inserted += db.session.execute(
+            sqlite_insert(model.__table__).on_conflict_do_nothing(index_elements=['name']),
+            [{'name': name} for name in chunk]
+        ).rowcount
+    return inserted
+
+def name_ids(model, names):
+    """Return {name: id} for the names that exist, one IN query per chunk."""
+    ids = {}
+    for chunk in chunked(dict.fromkeys(names)):
+        ids.update(db.session.execute(db.select(model.name, model.id).where(model.name.in_(chunk))).all())
+    return ids
+
+def get_or_create_ids(model, names):
+    """Return {name: id} for names, inserting the missing rows in bulk."""
+    insert_names(model, names)
+    return name_ids(model, names)
+
+def insert_links(model, column, pairs):
+    """Insert (doctor_id, other_id) pairs, skipping ones that already exist."""
+    rows = [{'doctor_id': doctor_id, column: other_id} for doctor_id, other_id in dict.fromkeys(pairs)]
+    inserted = 0
+    for chunk in chunked(rows):
+        inserted += db.session.execute(sqlite_insert(model.__table__).on_conflict_do_nothing(), chunk).rowcount
+    return inserted
+
+def doctor_ids_by_name(names):
+    """Resolve doctor names to ids with one IN query per chunk."""
+    ids = []
+    for chunk in chunked(dict.fromkeys(names)):
+        ids.extend(db.session.scalars(db.select(Doctor.id).where(Doctor.name.in_(chunk))))
+    return ids
+
+def bulk_unlink(model, column, other_id, doctor_ids):
+    """Remove the links between doctors and one insurance/specialty."""
+    other = getattr(model, column)
+    removed = 0
+    for chunk in chunked(doctor_ids):
+        removed += db.session.execute(
+            db.delete(model).where(other == other_id, model.doctor_id.in_(chunk))
+        ).rowcount
+    return removed
+
+def import_json_directory(path):
+    """One-time import of doctors_data.json into the relational store."""
+    with open(path, 'r') as f:
+        entries = json.load(f)['doctors_specialties']
+
+    doctor_ids = get_or_create_ids(Doctor, [e['doctor'] for e in entries])
+    insurance_ids = get_or_create_ids(Insurance, [i for e in entries for i in e.get('insurances', [])])
+    specialty_ids = get_or_create_ids(Specialty, [s for e in entries if e['specialty'] for s in e['specialty'].split(', ')])
+    insert_links(DoctorInsurance, 'insurance_id', [
+        (doctor_ids[e['doctor']], insurance_ids[i]) for e in entries for i in e.get('insurances', [])
+    ])
+    insert_links(DoctorSpecialty, 'specialty_id', [
+        (doctor_ids[e['doctor']], specialty_ids[s]) for e in entries if e['specialty'] for s in e['specialty'].split(', ')
+    ])
+    db.session.merge(DataImport(source=os.path.basename(path)))
+    db.session.commit()
+    record_change('import_json', path=path, doctors=len(entries))
+    return len(entries)
+
+@app.cli.command('import-json')
+@click.argument('path', default='doctors_data.json')
+def import_json_command(path):
+    """Import a doctors_data.json file into medical.db."""
+    count = import_json_directory(path)
+    click.echo(f"Imported {count} doctors from {path}")
+
+def upsert_roster_chunk(records, report):
+    """Upsert one chunk of roster records in a single transaction."""
+    doctors = [r['doctor'] for r in records]
+    insurances = [i for r in records for i in r['insurances'] or ()]
+    specialties = [s for r in records for s in r['specialties'] or ()]
+    report['doctors_added'] += insert_names(Doctor, doctors)
+    report['insurances_added'] += insert_names(Insurance, insurances)
+    report['specialties_added'] += insert_names(Specialty, specialties)
+    doctor_ids = name_ids(Doctor, doctors)
+    insurance_ids = name_ids(Insurance, insurances)
+    specialty_ids = name_ids(Specialty, specialties)
+    report['insurance_links_added'] += insert_links(DoctorInsurance, 'insurance_id', [
+        (doctor_ids[r['doctor']], insurance_ids[i]) for r in records for i in r['insurances'] or ()
+    ])
+    report['specialty_links_added'] += insert_links(DoctorSpecialty, 'specialty_id', [
+        (doctor_ids[r['doctor']], specialty_ids[s]) for r in records for s in r['specialties'] or ()
+    ])
+    db.session.commit()
+    record_change('upsert_roster', records=records)
+
+def new_import_report():
+    return {
+        'rows': 0, 'doctors_added': 0, 'insurances_added': 0, 'specialties_added': 0,
+        'insurance_links_added': 0, 'specialty_links_added': 0, 'rejected': []
+    }
+
+def upsert_records(records, report, chunk_size=1000):
+    """Upsert an iterable of roster records, one transaction per chunk."""
+    chunk = []
+    for record in records:
+        report['rows'] += 1
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            upsert_roster_chunk(chunk, report)
+            chunk = []
+    if chunk:
+        upsert_roster_chunk(chunk, report)
+    return report
+
+def import_roster(stream, filename, chunk_size=1000):
+    """Stream a CSV/XLSX roster into the database in chunks.
+
+    Each chunk is one transaction; returns counts plus the rejected rows.
+    """
+    report = new_import_report()
+
+    def accepted():
+        for line, record, error in iter_roster(stream, filename):
+            if error:
+                report['rejected'].append({'line': line, 'error': error})
+            else:
+                yield record
+
+    return upsert_records(accepted(), report, chunk_size)
+
+def current_roster():
+    """The directory as {doctor: (set of insurances, set of specialties)}."""
+    return {
+        entry['doctor']: (
+            set(entry.get('insurances', [])),
+            set(entry['specialty'].split(', ') if entry['specialty'] else [])
+        )
+        for entry in provider_directory.get()['doctors_specialties']
+    }
+
+def apply_roster_diff(diff):
+    """Apply a diff_roster() result as one transaction, i.e. one version bump."""
+    # Only additions and link targets insert; unlink targets deleted since
+    # the diff was taken are skipped, not recreated
+    unlinks = diff['unlink_insurances'] + diff['unlink_specialties']
+    doctor_ids = get_or_create_ids(Doctor, diff['add_doctors'] + [
+        doctor for doctor, _ in diff['link_insurances'] + diff['link_specialties']
+    ])
+    doctor_ids.update(name_ids(Doctor, [doctor for doctor, _ in unlinks if doctor not in doctor_ids]))
+    insurance_ids = get_or_create_ids(Insurance, [name for _, name in diff['link_insurances']])
+    specialty_ids = get_or_create_ids(Specialty, [name for _, name in diff['link_specialties']])
+    insert_links(DoctorInsurance, 'insurance_id', [
+        (doctor_ids[doctor], insurance_ids[name]) for doctor, name in diff['link_insurances']
+    ])
+    insert_links(DoctorSpecialty, 'specialty_id', [
+        (doctor_ids[doctor], specialty_ids[name]) for doctor, name in diff['link_specialties']
+    ])
+
+    for model, column, other_model, pairs in (
+            (DoctorInsurance, 'insurance_id', Insurance, diff['unlink_insurances']),
+            (DoctorSpecialty, 'specialty_id', Specialty, diff['unlink_specialties'])):
+        by_name = {}
+        for doctor, name in pairs:
+            if doctor in doctor_ids:
+                by_name.setdefault(name, []).append(doctor_ids[doctor])
+        other_ids = name_ids(other_model, by_name)
+        for name, ids in by_name.items():
+            if name in other_ids:
+                bulk_unlink(model, column, other_ids[name], ids)
+
+    delete_ids = doctor_ids_by_name(diff['delete_doctors'])
+    for chunk in chunked(delete_ids):
+        db.session.execute(db.delete(DoctorInsurance).where(DoctorInsurance.doctor_id.in_(chunk)))
+        db.session.execute(db.delete(DoctorSpecialty).where(DoctorSpecialty.doctor_id.in_(chunk)))
+        db.session.execute(db.delete(Doctor).where(Doctor.id.in_(chunk)))
+    db.session.commit()
+    record_change('sync_roster', **diff)
+
+def sync_roster(stream, filename, insurance=None, dry_run=False):
+    """Bring the directory in line with a roster, touching only what differs."""
+    rejected = []
+
+    def accepted():
+        for line, record, error in iter_roster(stream, filename):
+            if error:
+                rejected.append({'line': line, 'error': error})
+            else:
+                yield record
+
+    diff = diff_roster(current_roster(), accepted(), insurance)
+    if not dry_run and any(diff.values()):
+        apply_roster_diff(diff)
+    report = {name: len(changes) for name, changes in diff.items()}
+    report.update(applied=not dry_run, rejected=rejected)
+    return report
+
+@app.cli.command('sync-roster')
+@click.argument('path')
+@click.option('--insurance', help="Only sync this plan's links (a single payer's roster).")
+@click.option('--dry-run', is_flag=True, help='Report the changes without applying them.')
+def sync_roster_command(path, insurance, dry_run):
+    """Apply only the differences between a CSV/XLSX roster and the directory."""
+    try:
+        with open(path, 'rb') as f:
+            report = sync_roster(f, path, insurance, dry_run)
+    except RosterError as e:
+        raise click.ClickException(str(e))
+    click.echo(', '.join(f"{name}: {report[name]}" for name in report if name not in ('applied', 'rejected')))
+    click.echo("Applied" if report['applied'] else "Dry run, nothing applied")
+    for rejected in report['rejected']:
+        click.echo(f"  line {rejected['line']}: {rejected['error']}", err=True)
+
+@app.cli.command('import-roster')
+@click.argument('path')
+@click.option('--chunk-size', default=1000, show_default=True, help='Rows per transaction.')
+def import_roster_command(path, chunk_size):
+    """Import a CSV/XLSX roster of doctors, plans and specialties."""
+    start = time.perf_counter()
+    try:
+        with open(path, 'rb') as f:
+            report = import_roster(f, path, chunk_size)
+    except RosterError as e:
+        raise click.ClickException(str(e))
+    elapsed = time.perf_counter() - start
+    click.echo(
+        f"Imported {report['rows']} rows in {elapsed:.2f}s: "
+        f"{report['doctors_added']} doctors, {report['insurances_added']} insurances, "
+        f"{report['specialties_added']} specialties, {report['insurance_links_added']} insurance links, "
+        f"{report['specialty_links_added']} specialty links added"
+    )
+    for rejected in report['rejected']:
+        click.echo(f"  line {rejected['line']}: {rejected['error']}", err=True)
+
+@app.cli.command('export-json')
+@click.argument('path', default='doctors_data.json')
+def export_json_command(path):
+    """Write the directory in medical.db out as a doctors_data.json file."""
+    data = load_directory()
+    atomic_write_json(path, {"doctors_specialties": data['doctors_specialties']}, indent=2)
+    click.echo(f"Exported {len(data['doctors_specialties'])} doctors to {path}")
+
+def import_json_once(path='doctors_data.json'):
+    """Seed an empty database from path the first time the app starts.
+
+    The import is recorded in DataImport, so deleting every doctor later
+    doesn't bring the seed data back on the next boot; 'flask import-json'
+    imports again on purpose.
+    """
+    source = os.path.basename(path)
+    if db.session.get(DataImport, source) is not None:
+        return
+    try:
+        if os.path.exists(path) and db.session.scalar(db.select(Doctor.id).limit(1)) is None:
+            import_json_directory(path)
+        else:
+            # Nothing to seed, or a database that predates the marker
+            db.session.add(DataImport(source=source))
+            db.session.commit()
+    except IntegrityError:
+        # Another worker imported it first
+        db.session.rollback()
+
+def load_directory_or_snapshot():
+    """Attach to the shared snapshot if it is current, else rebuild it."""
+    path = app.config['DIRECTORY_SNAPSHOT']
+    signature = database_file_signature()
+    if not path or signature is None:
+        return load_directory()
+    snapshot = DirectorySnapshot.attach(path, signature)
+    if snapshot is not None:
+        return snapshot.data
+    # Read before loading: a change that lands in between is then replayed on
+    # top of the snapshot, which is harmless, rather than skipped
+    offset = journal_end()
+    data = load_directory()
+    # The first worker to see a change pays for the rebuild; the rest attach
+    write_snapshot(path, data, signature, offset)
+    return data
+
+def compact_journal():
+    """Fold the journal into a fresh snapshot; return False if it was current.
+
+    The snapshot records the journal offset it reaches, so a replica loads it
+    and only replays the entries after that.
+    """
+    path = app.config['DIRECTORY_SNAPSHOT']
+    signature = database_file_signature()
+    if not path or signature is None:
+        return False
+    offset = journal_end()
+    snapshot = DirectorySnapshot.attach(path, signature)
+    if snapshot is not None and snapshot.journal_offset == offset:
+        return False
+    write_snapshot(path, load_directory(), signature, offset)
+    return True
+
+def start_compactor(interval):
+    """Compact in a daemon thread every interval seconds.
+
+    Readers then attach to an up-to-date snapshot instead of the first one
+    after a change rebuilding it on the request path.
+    """
+    def run():
+        while True:
+            time.sleep(interval)
+            try:
+                with app.app_context():
+                    compact_journal()
+            except Exception as e:
+                print(f"Journal compaction failed: {e}")
+
+    thread = threading.Thread(target=run, name='journal-compactor', daemon=True)
+    thread.start()
+    return thread
+
+@app.cli.command('build-snapshot')
+def build_snapshot_command():
+    """Write the directory snapshot that workers attach to at startup."""
+    path = app.config['DIRECTORY_SNAPSHOT']
+    signature = database_file_signature()
+    offset = journal_end()
+    data = load_directory()
+    write_snapshot(path, data, signature, offset)
+    click.echo(f"Wrote {len(data['doctors_specialties'])} doctors to {path}")
+
+@app.cli.command('compact-journal')
+def compact_journal_command():
+    """Fold the change journal into a fresh directory snapshot."""
+    if compact_journal():
+        click.echo(f"Snapshot now reaches journal offset {journal_end()}")
+    else:
+        click.echo("Snapshot already up to date")
+
+@app.cli.command('journal')
+@click.option('--after', default=0, show_default=True, help='Journal offset to start from.')
+@click.option('--follow', is_flag=True, help='Keep printing new entries as they are written.')
+def journal_command(after, follow):
+    """Print the change journal as JSON lines."""
+    if journal is None:
+        raise click.ClickException("The journal is disabled (DIRECTORY_JOURNAL is empty)")
+    if not journal.is_boundary(after):
+        raise click.ClickException(f"{after} is not the offset of a journal entry")
+    entries = journal.tail(after) if follow else journal.read(after)
+    for offset, _, entry in entries:
+        click.echo(json.dumps(dict(entry, offset=offset)))
+
+@app.cli.command('build-logos')
+@click.argument('source', default='FMC LOGO PNG GOOD.png', type=click.Path(exists=True, dir_okay=False))
+def build_logos_command(source):
+    """Resize the logo into the static/logo-<width>.png variants (needs Pillow)."""
+    try:
+        paths = build_logo_variants(source, app.static_folder)
+    except ImportError:
+        raise click.ClickException("Pillow is needed to build the logos: pip install Pillow")
+    for path in paths:
+        click.echo(f"Wrote {path} ({os.path.getsize(path)} bytes)")
+
+# Loaded once per process; rebuilt when the database changes
+provider_directory = ProviderDirectory(load_directory_or_snapshot, database_version)
+
+if os.environ.get('JOURNAL_COMPACT_INTERVAL'):
+    start_compactor(float(os.environ['JOURNAL_COMPACT_INTERVAL']))
+
+# Rendered verify/specialty pages, keyed on their args and the data version
+page_cache = ResponseCache(maxsize=256)
+# Typeahead answers; kept apart so keystrokes don't evict rendered pages
+search_cache = ResponseCache(maxsize=2048)
+# Shared by the verify pages and the JSON API
+query_engine = QueryEngine(provider_directory)
+
+def open_session_store():
+    ttl = app.config['AUTH_SESSION_IDLE'].total_seconds()
+    if app.config['AUTH_SESSION_BACKEND'] == 'memory':
+        return MemorySessionStore(ttl)
+    os.makedirs(app.instance_path, exist_ok=True)
+    return SQLiteSessionStore(os.path.join(app.instance_path, 'sessions.db'), ttl)
+
+session_store = open_session_store()
 
 def requires_auth(f):
     @wraps(f)
     def decorated(*args, **kwargs):
-        if not session.get('authenticated'):
+        # Also slides the session's expiry forward
+        if not session_store.touch(request.cookies.get(app.config['AUTH_SESSION_COOKIE'])):
             return redirect(url_for('login'))
         return f(*args, **kwargs)
     return decorated
+
+@app.cli.command('revoke-sessions')
+def revoke_sessions_command():
+    """Log everyone out."""
+    click.echo(f"Revoked {session_store.revoke_all()} sessions")
 insurances = []
 relationships = []
 
@@ -59,51 +578,17 @@ html_template = """
 <!doctype html>
 <head>
   <title>First MedCare Insurance Verifier</title>
-  <link href="https://fonts.googleapis.com/css2?family=Inter:wght@400;600&display=swap" rel="stylesheet">
+  <link href="{{ asset_url('site.css') }}" rel="stylesheet">
   <style>
     .logo {
       height: 50px;
       vertical-align: middle;
       margin-right: 1rem;
     }
-    .nav-logo {
-      display: flex;
-      align-items: center;
-      gap: 2rem;
-    }
-    .nav-logo-img {
-      height: 50px;
-      width: auto;
-    }
-    .nav-links {
-      display: flex;
-      gap: 1.5rem;
-    }
     .hero-logo {
       height: 120px;
       margin-bottom: 2rem;
     }
-    body {
-      font-family: 'Inter', sans-serif;
-      margin: 0;
-      padding: 0;
-      background: #f8fafc;
-      color: #1e293b;
-    }
-    nav {
-      background: white;
-      padding: 1rem;
-      box-shadow: 0 1px 3px rgba(0,0,0,0.1);
-    }
-    nav a {
-      color: #1e293b;
-      text-decoration: none;
-      margin-right: 1.5rem;
-      font-weight: 500;
-    }
-    nav a:hover {
-      color: #3b82f6;
-    }
     .hero {
       text-align: center;
       padding: 4rem 2rem;
@@ -167,7 +652,7 @@ html_template = """
 <body>
   <nav>
     <div class="nav-logo">
-      <img src="/static/FMC LOGO PNG GOOD.png" alt="First MedCare Logo" class="nav-logo-img">
+      <img src="{{ asset_url('logo-128.png') }}" srcset="{{ asset_srcset('logo-{}.png') }}" sizes="106px" width="106" height="50" alt="First MedCare Logo" class="nav-logo-img">
       <div class="nav-links">
         <a href="/">Home</a>
         <a href="/query_page">Verify Insurance</a>
@@ -176,7 +661,7 @@ html_template = """
     </div>
   </nav>
   <div class="hero">
-    <img src="/static/FMC LOGO PNG GOOD.png" alt="First MedCare Logo" class="hero-logo">
+    <img src="{{ asset_url('logo-256.png') }}" srcset="{{ asset_srcset('logo-{}.png') }}" sizes="254px" width="254" height="120" alt="First MedCare Logo" class="hero-logo">
     <h1>First MedCare Insurance Verifier</h1>
     <h3>Powered By Joseph</h3>
     <p>Streamline your insurance verification process with our easy-to-use platform. Check doctor-insurance compatibility instantly and manage your healthcare network efficiently.</p>
@@ -192,46 +677,12 @@ management_template = """
 <!doctype html>
 <head>
   <title>Management - First MedCare Insurance Verifier</title>
-  <link href="https://fonts.googleapis.com/css2?family=Inter:wght@400;600&display=swap" rel="stylesheet">
+  <link href="{{ asset_url('site.css') }}" rel="stylesheet">
   <style>
     .logo {
       height: 40px;
       vertical-align: middle;
     }
-    .nav-logo {
-      display: flex;
-      align-items: center;
-      gap: 2rem;
-    }
-    .nav-logo-img {
-      height: 50px;
-      width: auto;
-    }
-    .nav-links {
-      display: flex;
-      gap: 1.5rem;
-    }
-    body {
-      font-family: 'Inter', sans-serif;
-      margin: 0;
-      padding: 0;
-      background: #f8fafc;
-      color: #1e293b;
-    }
-    nav {
-      background: white;
-      padding: 1rem;
-      box-shadow: 0 1px 3px rgba(0,0,0,0.1);
-    }
-    nav a {
-      color: #1e293b;
-      text-decoration: none;
-      margin-right: 1.5rem;
-      font-weight: 500;
-    }
-    nav a:hover {
-      color: #3b82f6;
-    }
     .container {
       max-width: 800px;
       margin: 2rem auto;
@@ -385,7 +836,7 @@ management_template = """
 <body>
   <nav>
     <div class="nav-logo">
-      <img src="/static/FMC LOGO PNG GOOD.png" alt="First MedCare Logo" class="nav-logo-img">
+      <img src="{{ asset_url('logo-128.png') }}" srcset="{{ asset_srcset('logo-{}.png') }}" sizes="106px" width="106" height="50" alt="First MedCare Logo" class="nav-logo-img">
       <div class="nav-links">
         <a href="/">Home</a>
         <a href="/query_page">Verify Insurance</a>
@@ -434,32 +885,39 @@ management_template = """
             </div>
             <div style="margin-bottom: 1rem;">
               <h4 style="margin-bottom: 0.5rem;">Select Doctors:</h4>
-              <div style="max-height: 300px; overflow-y: auto; border: 1px solid #e2e8f0; padding: 1rem; border-radius: 0.5rem; width: 500px;">
-                {% for doc in doctors %}
-                  <div style="margin-bottom: 0.5rem; display: flex; align-items: center;">
-                    <input type="checkbox" name="selected_doctors" value="{{ doc }}" id="doc_{{ loop.index }}" style="margin-right: 10px; width: 20px; height: 20px;">
-                    <label for="doc_{{ loop.index }}" style="font-size: 1.1rem;">{{ doc }}</label>
-                  </div>
-                {% endfor %}
+              <input type="search" class="list-filter" data-list="mass-doctors" placeholder="Filter doctors" style="width: 500px; margin-bottom: 0.5rem;">
+              <div class="lazy-scroll" style="max-height: 300px; overflow-y: auto; border: 1px solid #e2e8f0; padding: 1rem; border-radius: 0.5rem; width: 500px;">
+                <div class="lazy-list" id="mass-doctors" data-kind="doctors" data-checkbox="doctor_name"></div>
               </div>
             </div>
             <input type="submit" value="Link Selected Doctors" style="margin-top: 1rem;">
+            <input type="submit" value="Unlink Selected Doctors" formaction="/mass_unlink" style="background: #ef4444;">
+          </div>
+        </form>
+
+        <h2 style="margin-top: 2rem;">Import Roster</h2>
+        <form method="post" action="/import_roster" enctype="multipart/form-data" style="display: inline-block; text-align: center;">
+          <div class="form-group" style="justify-content: center;">
+            <input type="file" name="roster" accept=".csv,.xlsx">
+            <input type="submit" value="Import">
+          </div>
+        </form>
+
+        <h2 style="margin-top: 2rem;">Sync Roster</h2>
+        <form method="post" action="/sync_roster" enctype="multipart/form-data" style="display: inline-block; text-align: center;">
+          <div class="form-group" style="justify-content: center;">
+            <input type="file" name="roster" accept=".csv,.xlsx">
+            <input type="text" name="insurance" list="insurance-options" data-suggest="insurance" placeholder="Only this insurance (optional)" autocomplete="off">
+            <label><input type="checkbox" name="dry_run" value="1" checked> Dry run</label>
+            <input type="submit" value="Sync">
           </div>
         </form>
 
         <h2 style="margin-top: 2rem;">Link Doctor to Insurance</h2>
         <form method="post" action="/link" style="display: inline-block; text-align: center;">
           <div class="form-group" style="justify-content: center;">
-            <select name="doctor">
-              {% for doc in doctors %}
-                <option>{{ doc }}</option>
-              {% endfor %}
-            </select>
-            <select name="insurance">
-              {% for ins in insurances %}
-                <option>{{ ins }}</option>
-              {% endfor %}
-            </select>
+            <input type="text" name="doctor" list="doctor-options" data-suggest="doctor" placeholder="Doctor" autocomplete="off">
+            <input type="text" name="insurance" list="insurance-options" data-suggest="insurance" placeholder="Insurance" autocomplete="off">
             <input type="submit" value="Link">
           </div>
         </form>
@@ -467,128 +925,158 @@ management_template = """
         <h2 style="margin-top: 2rem;">Link Doctor to Specialty</h2>
         <form method="post" action="/link_specialty" style="display: inline-block; text-align: center;">
           <div class="form-group" style="justify-content: center;">
-            <select name="doctor">
-              {% for doc in doctors %}
-                <option>{{ doc }}</option>
-              {% endfor %}
-            </select>
-            <select name="specialty">
-              {% for spec in specialties %}
-                <option>{{ spec }}</option>
-              {% endfor %}
-            </select>
+            <input type="text" name="doctor" list="doctor-options" data-suggest="doctor" placeholder="Doctor" autocomplete="off">
+            <input type="text" name="specialty" list="specialty-options" data-suggest="specialty" placeholder="Specialty" autocomplete="off">
             <input type="submit" value="Link">
           </div>
         </form>
+        <datalist id="doctor-options"></datalist>
+        <datalist id="insurance-options"></datalist>
+        <datalist id="specialty-options"></datalist>
       </div>
 
+<!-- Each list below is filled page by page from /api/management/<kind> as it scrolls into view -->
 <h3>Doctors</h3>
-<ul>
-{% for d in doctors %}
-  <li>
-    {{ d }}
-    <form method="post" action="/delete_doctor" style="display: inline;">
-      <input type="hidden" name="doctor_name" value="{{ d }}">
-      <input type="submit" value="Delete" style="background: #ef4444;">
-    </form>
-  </li>
-{% endfor %}
-</ul>
+<input type="search" class="list-filter" data-list="doctors-list" placeholder="Filter">
+<ul class="lazy-list" id="doctors-list" data-kind="doctors" data-label="{doctor_name}" data-action="/delete_doctor" data-button="Delete"></ul>
 
 <h3>Insurances</h3>
-<ul>
-{% for i in insurances %}
-  <li>
-    {{ i }}
-    <form method="post" action="/delete_insurance" style="display: inline;">
-      <input type="hidden" name="insurance_name" value="{{ i }}">
-      <input type="submit" value="Delete" style="background: #ef4444;">
-    </form>
-  </li>
-{% endfor %}
-</ul>
+<input type="search" class="list-filter" data-list="insurances-list" placeholder="Filter">
+<ul class="lazy-list" id="insurances-list" data-kind="insurances" data-label="{insurance_name}" data-action="/delete_insurance" data-button="Delete"></ul>
 
 <h3>Specialties</h3>
-<ul>
-{% for s in specialties %}
-  <li>
-    {{ s }}
-    <form method="post" action="/delete_specialty" style="display: inline;">
-      <input type="hidden" name="specialty_name" value="{{ s }}">
-      <input type="submit" value="Delete" style="background: #ef4444;">
-    </form>
-  </li>
-{% endfor %}
-</ul>
+<input type="search" class="list-filter" data-list="specialties-list" placeholder="Filter">
+<ul class="lazy-list" id="specialties-list" data-kind="specialties" data-label="{specialty_name}" data-action="/delete_specialty" data-button="Delete"></ul>
 
 <h3>Relationships</h3>
-<ul>
-{% for doc, ins in relationships %}
-  <li>
-    {{ doc }} accepts {{ ins }}
-    <form method="post" action="/unlink" style="display: inline;">
-      <input type="hidden" name="doctor" value="{{ doc }}">
-      <input type="hidden" name="insurance" value="{{ ins }}">
-      <input type="submit" value="Unlink">
-    </form>
-  </li>
-{% endfor %}
-</ul>
+<input type="search" class="list-filter" data-list="relationships-list" placeholder="Filter">
+<ul class="lazy-list" id="relationships-list" data-kind="relationships" data-label="{doctor} accepts {insurance}" data-action="/unlink" data-button="Unlink"></ul>
 
 <h3>Specialty Relationships</h3>
-<ul>
-{% for doc, spec in specialty_relationships %}
-  <li>
-    {{ doc }} has specialty {{ spec }}
-    <form method="post" action="/unlink_specialty" style="display: inline;">
-      <input type="hidden" name="doctor" value="{{ doc }}">
-      <input type="hidden" name="specialty" value="{{ spec }}">
-      <input type="submit" value="Unlink">
-    </form>
-  </li>
-{% endfor %}
-</ul>
+<input type="search" class="list-filter" data-list="specialty-relationships-list" placeholder="Filter">
+<ul class="lazy-list" id="specialty-relationships-list" data-kind="specialty_relationships" data-label="{doctor} has specialty {specialty}" data-action="/unlink_specialty" data-button="Unlink"></ul>
+
+<script>
+  function renderItem(list, item) {
+    var row = document.createElement(list.dataset.checkbox ? 'div' : 'li');
+    if (list.dataset.checkbox) {
+      row.style.cssText = 'margin-bottom: 0.5rem; display: flex; align-items: center;';
+      var label = document.createElement('label');
+      var box = document.createElement('input');
+      box.type = 'checkbox';
+      box.name = 'selected_doctors';
+      box.value = item[list.dataset.checkbox];
+      box.style.cssText = 'margin-right: 10px; width: 20px; height: 20px;';
+      label.style.fontSize = '1.1rem';
+      label.append(box, item[list.dataset.checkbox]);
+      row.append(label);
+      return row;
+    }
+    row.append(list.dataset.label.replace(/{(\\w+)}/g, function (_, field) { return item[field]; }) + ' ');
+    var form = document.createElement('form');
+    form.method = 'post';
+    form.action = list.dataset.action;
+    form.style.display = 'inline';
+    Object.keys(item).forEach(function (field) {
+      var hidden = document.createElement('input');
+      hidden.type = 'hidden';
+      hidden.name = field;
+      hidden.value = item[field];
+      form.append(hidden);
+    });
+    var button = document.createElement('input');
+    button.type = 'submit';
+    button.value = list.dataset.button;
+    if (list.dataset.button === 'Delete') button.style.background = '#ef4444';
+    form.append(button);
+    row.append(form);
+    return row;
+  }
+
+  function LazyList(list) {
+    var state = {next: 0, query: '', loading: false, generation: 0};
+    var sentinel = document.createElement('div');
+    list.after(sentinel);
+
+    function load() {
+      if (state.loading || state.next === null) return;
+      state.loading = true;
+      var generation = state.generation;
+      var params = new URLSearchParams({offset: state.next, q: state.query});
+      fetch('/api/management/' + list.dataset.kind + '?' + params, {credentials: 'same-origin'})
+        .then(function (response) { return response.json(); })
+        .then(function (page) {
+          if (generation !== state.generation) return;
+          page.items.forEach(function (item) { list.append(renderItem(list, item)); });
+          state.next = page.next;
+        })
+        .finally(function () {
+          state.loading = false;
+          if (generation === state.generation && state.next !== null && isVisible()) load();
+        });
+    }
+
+    function isVisible() {
+      var box = sentinel.getBoundingClientRect();
+      return box.top < window.innerHeight + 200 && box.bottom > -200;
+    }
+
+    this.reset = function (query) {
+      state = {next: 0, query: query, loading: false, generation: state.generation + 1};
+      list.textContent = '';
+      load();
+    };
+    new IntersectionObserver(function (entries) {
+      if (entries[0].isIntersecting) load();
+    }, {rootMargin: '200px'}).observe(sentinel);
+  }
+
+  var lists = {};
+  document.querySelectorAll('.lazy-list').forEach(function (list) {
+    lists[list.id] = new LazyList(list);
+  });
+
+  function debounce(f, wait) {
+    var timer;
+    return function () {
+      var self = this;
+      clearTimeout(timer);
+      timer = setTimeout(function () { f.call(self); }, wait);
+    };
+  }
+
+  document.querySelectorAll('.list-filter').forEach(function (input) {
+    input.addEventListener('input', debounce(function () {
+      lists[input.dataset.list].reset(input.value);
+    }, 200));
+  });
+
+  document.querySelectorAll('[data-suggest]').forEach(function (input) {
+    var options = document.getElementById(input.getAttribute('list'));
+    input.addEventListener('input', debounce(function () {
+      if (!input.value) return;
+      var params = new URLSearchParams({q: input.value, kind: input.dataset.suggest, limit: 20});
+      fetch('/api/typeahead?' + params)
+        .then(function (response) { return response.json(); })
+        .then(function (page) {
+          options.textContent = '';
+          page.results.forEach(function (result) {
+            var option = document.createElement('option');
+            option.value = result.name;
+            options.append(option);
+          });
+        });
+    }, 150));
+  });
+</script>
 """
 
 specialties_template = """
 <!doctype html>
 <head>
     <title>Our Specialties - First MedCare</title>
-    <link href="https://fonts.googleapis.com/css2?family=Inter:wght@400;600&display=swap" rel="stylesheet">
+    <link href="{{ asset_url('site.css') }}" rel="stylesheet">
     <style>
-        body {
-            font-family: 'Inter', sans-serif;
-            margin: 0;
-            padding: 0;
-            background: #f8fafc;
-        }
-        .nav-logo {
-            display: flex;
-            align-items: center;
-            gap: 2rem;
-        }
-        .nav-logo-img {
-            height: 50px;
-            width: auto;
-        }
-        .nav-links {
-            display: flex;
-            gap: 1.5rem;
-        }
-        nav {
-            background: white;
-            padding: 1rem;
-            box-shadow: 0 1px 3px rgba(0,0,0,0.1);
-        }
-        nav a {
-            color: #1e293b;
-            text-decoration: none;
-            margin-right: 1.5rem;
-            font-weight: 500;
-        }
-        nav a:hover {
-            color: #3b82f6;
-        }
         .container {
             max-width: 1200px;
             margin: 2rem auto;
@@ -657,7 +1145,7 @@ specialties_template = """
 <body>
     <nav>
         <div class="nav-logo">
-            <img src="/static/FMC LOGO PNG GOOD.png" alt="First MedCare Logo" class="nav-logo-img">
+            <img src="{{ asset_url('logo-128.png') }}" srcset="{{ asset_srcset('logo-{}.png') }}" sizes="106px" width="106" height="50" alt="First MedCare Logo" class="nav-logo-img">
             <div class="nav-links">
                 <a href="/">Home</a>
                 <a href="/query_page">Verify Insurance</a>
@@ -714,46 +1202,12 @@ query_template = """
 <!doctype html>
 <head>
   <title>Insurance Verification - First MedCare</title>
-  <link href="https://fonts.googleapis.com/css2?family=Inter:wght@400;600&display=swap" rel="stylesheet">
+  <link href="{{ asset_url('site.css') }}" rel="stylesheet">
   <style>
     .logo {
       height: 40px;
       vertical-align: middle;
     }
-    .nav-logo {
-      display: flex;
-      align-items: center;
-      gap: 2rem;
-    }
-    .nav-logo-img {
-      height: 50px;
-      width: auto;
-    }
-    .nav-links {
-      display: flex;
-      gap: 1.5rem;
-    }
-    body {
-      font-family: 'Inter', sans-serif;
-      margin: 0;
-      padding: 0;
-      background: #f8fafc;
-      color: #1e293b;
-    }
-    nav {
-      background: white;
-      padding: 1rem;
-      box-shadow: 0 1px 3px rgba(0,0,0,0.1);
-    }
-    nav a {
-      color: #1e293b;
-      text-decoration: none;
-      margin-right: 1.5rem;
-      font-weight: 500;
-    }
-    nav a:hover {
-      color: #3b82f6;
-    }
     .container {
       max-width: 800px;
       margin: 2rem auto;
@@ -811,27 +1265,12 @@ query_template = """
       outline: none;
       box-shadow: 0 0 0 2px rgba(59, 130, 246, 0.2);
     }
-    .results {
-      background: #f1f5f9;
-      padding: 1.5rem;
-      border-radius: 0.375rem;
-      margin-top: 2rem;
-    }
-    .results ul {
-      list-style: none;
-      padding: 0;
-      margin: 0;
-    }
-    .results li {
-      padding: 0.5rem 0;
-      color: #475569;
-    }
   </style>
 </head>
 <body>
   <nav>
     <div class="nav-logo">
-      <img src="/static/FMC LOGO PNG GOOD.png" alt="First MedCare Logo" class="nav-logo-img">
+      <img src="{{ asset_url('logo-128.png') }}" srcset="{{ asset_srcset('logo-{}.png') }}" sizes="106px" width="106" height="50" alt="First MedCare Logo" class="nav-logo-img">
       <div class="nav-links">
         <a href="/">Home</a>
         <a href="/query_page">Verify Insurance</a>
@@ -852,7 +1291,7 @@ query_template = """
         <input type="text" onkeyup="filterItems('insurance')" placeholder="Search for insurance...">
         <div class="dropdown-content">
           {% for ins in insurances %}
-            <a href="/query_page?insurance_query={{ ins }}">{{ ins }}</a>
+            <a href="{{ url_for('query_page', insurance_query=ins, specialty_query=specialty_query) }}">{{ ins }}</a>
           {% endfor %}
         </div>
       </div>
@@ -898,17 +1337,8 @@ query_template = """
 
       <div id="doctorSearch" class="search-box" style="display: none;">
           <div class="doctor-grid">
-            {% for doc in doctors %}              {% set doc_specialties = [] %}
-              {% for entry in data['doctors_specialties'] %}
-                {% if entry['doctor'] == doc %}
-                  {% for spec in specialties %}
-                    {% if spec in entry['specialty'].split(', ') %}
-                      {% set _ = doc_specialties.append(loop.index) %}
-                    {% endif %}
-                  {% endfor %}
-                {% endif %}
-              {% endfor %}
-              <button class="specialty-button doctor-button {% if doc_specialties|length == 1 %}doctor-{{ doc_specialties[0] }}{% elif doc_specialties|length == 2 %}doctor-{{ doc_specialties[0] }}-{{ doc_specialties[1] }}{% endif %}" onclick="showDoctorResults('{{ doc }}')">{{ doc }}</button>
+            {% for doc in doctors %}
+              <button class="specialty-button doctor-button {{ doctor_classes[doc] }}" onclick="showDoctorResults('{{ doc }}')">{{ doc }}</button>
             {% endfor %}
           </div>
       </div>
@@ -935,34 +1365,26 @@ query_template = """
           overflow: hidden;
           text-overflow: ellipsis;
         }
-        {% for doc in doctors %}
-          {% set doc_specialties = [] %}
-          {% for entry in data['doctors_specialties'] %}
-            {% if entry['doctor'] == doc %}
-              {% for spec in entry['specialty'].split(', ') %}
-                {% set _ = doc_specialties.append(loop.index) %}
-              {% endfor %}
-            {% endif %}
-          {% endfor %}
-          {% if doc_specialties|length == 1 %}
-          .doctor-{{ doc_specialties[0] }} {
-            background: hsl({{ (doc_specialties[0] * 37) % 360 }}, 70%, 45%);
+        {% for class_name, hues in doctor_styles %}
+          {% if hues|length == 1 %}
+          .{{ class_name }} {
+            background: hsl({{ hues[0] }}, 70%, 45%);
           }
-          .doctor-{{ doc_specialties[0] }}:hover {
-            background: hsl({{ (doc_specialties[0] * 37) % 360 }}, 80%, 40%);
+          .{{ class_name }}:hover {
+            background: hsl({{ hues[0] }}, 80%, 40%);
             transform: scale(1.05);
           }
-          {% elif doc_specialties|length == 2 %}
-          .doctor-{{ doc_specialties[0] }}-{{ doc_specialties[1] }} {
+          {% else %}
+          .{{ class_name }} {
             background: linear-gradient(90deg, 
-              hsl({{ (doc_specialties[0] * 37) % 360 }}, 70%, 45%) 0%,
-              hsl({{ (doc_specialties[1] * 37) % 360 }}, 70%, 45%) 100%
+              hsl({{ hues[0] }}, 70%, 45%) 0%,
+              hsl({{ hues[1] }}, 70%, 45%) 100%
             );
           }
-          .doctor-{{ doc_specialties[0] }}-{{ doc_specialties[1] }}:hover {
+          .{{ class_name }}:hover {
             background: linear-gradient(90deg, 
-              hsl({{ (doc_specialties[0] * 37) % 360 }}, 80%, 40%) 0%,
-              hsl({{ (doc_specialties[1] * 37) % 360 }}, 80%, 40%) 100%
+              hsl({{ hues[0] }}, 80%, 40%) 0%,
+              hsl({{ hues[1] }}, 80%, 40%) 100%
             );
             transform: scale(1.05);
           }
@@ -1001,7 +1423,10 @@ query_template = """
     }
 
     function showResults(specialty) {
-      window.location.href = `/query_page?specialty_query=${encodeURIComponent(specialty)}`;
+      // Narrows a chosen insurance to the doctors with this specialty
+      var params = new URLSearchParams({specialty_query: specialty});
+      {% if insurance_query %}params.set('insurance_query', {{ insurance_query|tojson }});{% endif %}
+      window.location.href = '/query_page?' + params;
     }
 
     function showDoctorResults(doctor) {
@@ -1079,397 +1504,17 @@ query_template = """
         </ul>
       </div>
 
-      <style>
-        .doctor-result {
-          background: white;
-          padding: 1rem;
-          margin-bottom: 1rem;
-          border-radius: 0.5rem;
-          box-shadow: 0 1px 3px rgba(0,0,0,0.1);
-        }
-        .doctor-result h4 {
-          margin: 0 0 0.5rem 0;
-          color: #1e293b;
-        }
-        .doctor-result p {
-          margin: 0.25rem 0;
-          color: #4b5563;
-        }
-      </style>
     {% endif %}
   </div>
 </body>
 """
 
-@app.route('/')
-def index():
-    return render_template_string(html_template)
-
-@app.route('/login', methods=['GET', 'POST'])
-def login():
-    if request.method == 'POST':
-        session['authenticated'] = request.form['password'] == 'FMC8707$'
-        if session['authenticated']:
-            session.permanent = True  # Make the session permanent
-            return redirect(url_for('management'))
-        else:
-            return render_template_string('<p>Incorrect password</p><a href="{{ url_for("login") }}">Try again</a>')
-    return render_template_string("""
-<head>
-    <style>
-        body {
-            font-family: 'Inter', sans-serif;
-            background-color: #f8fafc;
-            display: flex;
-            flex-direction: column;
-            justify-content: center;
-            align-items: center;
-            height: 100vh;
-            margin: 0;
-        }
-        form {
-            background-color: #fff;
-            padding: 20px;
-            border-radius: 8px;
-            box-shadow: 0 4px 8px rgba(0, 0, 0, 0.1);
-            display: flex;
-            flex-direction: column;
-            width: 300px;
-            margin-bottom: 1rem;
-        }
-        input {
-            margin: 10px 0;
-            padding: 8px;
-            border: 1px solid #ddd;
-            border-radius: 4px;
-        }
-        button {
-            background-color: #3b82f6;
-            color: white;
-            padding: 10px 15px;
-            border: none;
-            border-radius: 4px;
-            cursor: pointer;
-            transition: background-color 0.2s;
-        }
-        button:hover {
-            background-color: #2563eb;
-        }
-    </style>
-</head>
-<form method="post">
-    <input type="password" name="password" placeholder="Password">
-    <button type="submit">Login</button>
-</form>
-<a href="/" style="text-decoration: none;">
-    <button style="background-color: #64748b; padding: 10px 15px; border: none; border-radius: 4px; color: white; cursor: pointer; transition: background-color 0.2s;">
-        Back to Home
-    </button>
-</a>
-""")
-
-@app.route('/logout')
-def logout():
-    session.pop('authenticated', None)
-    return redirect(url_for('index'))
-
-@app.route('/management', methods=['GET', 'POST'])
-@requires_auth
-def management():
-    import json
-
-    # Load current JSON data
-    try:
-        with open('doctors_data.json', 'r') as f:
-            data = json.load(f)
-    except:
-        data = {"doctors_specialties": []}
-
-    # Get doctors and their specialties from JSON
-    doctors = [d['doctor'] for d in data['doctors_specialties']]
-    specialties = list(set(sum([d['specialty'].split(', ') for d in data['doctors_specialties']], [])))
-
-    # Get insurance relationships
-    relationships = []
-    for doc in data['doctors_specialties']:
-        for ins in doc.get('insurances', []):
-            relationships.append((doc['doctor'], ins))
-
-    insurances = list(set([r[1] for r in relationships] if relationships else []))
-
-    # Get specialty relationships
-    specialty_relationships = []
-    for doc in data['doctors_specialties']:
-        for spec in doc['specialty'].split(', '):
-            specialty_relationships.append((doc['doctor'], spec))
-
-    return render_template_string(management_template, doctors=doctors, insurances=insurances, relationships=relationships, specialties=specialties, specialty_relationships=specialty_relationships)
-
-@app.route('/add_doctor', methods=['POST'])
-@requires_auth
-def add_doctor():
-    doctor_name = request.form['doctor_name']
-    new_doctor = Doctor(name=doctor_name)
-    db.session.add(new_doctor)
-    db.session.commit()
-    return redirect(url_for('management'))
-
-@app.route('/add_insurance', methods=['POST'])
-@requires_auth
-def add_insurance():
-    insurance_name = request.form['insurance_name']
-    new_insurance = Insurance(name=insurance_name)
-    db.session.add(new_insurance)
-    db.session.commit()
-    return redirect(url_for('management'))
-
-@app.route('/add_specialty', methods=['POST'])
-@requires_auth
-def add_specialty():
-    try:
-        specialty_name = request.form['specialty_name']
-        if specialty_name:
-            new_specialty = Specialty(name=specialty_name)
-            db.session.add(new_specialty)
-            db.session.commit()
-    except Exception as e:
-        db.session.rollback()
-        print(f"Error adding specialty: {e}")
-    return redirect(url_for('management'))
-
-@app.route('/delete_doctor', methods=['POST'])
-@requires_auth
-def delete_doctor():
-    doctor_name = request.form['doctor_name']
-    doctor_to_delete = Doctor.query.filter_by(name=doctor_name).first()
-    if doctor_to_delete:
-        # Delete all doctor-insurance relationships
-        DoctorInsurance.query.filter_by(doctor_id=doctor_to_delete.id).delete()
-        # Delete all doctor-specialty relationships
-        DoctorSpecialty.query.filter_by(doctor_id=doctor_to_delete.id).delete()
-        # Delete the doctor
-        db.session.delete(doctor_to_delete)
-        db.session.commit()
-    return redirect(url_for('management'))
-
-@app.route('/delete_insurance', methods=['POST'])
-@requires_auth
-def delete_insurance():
-    insurance_name = request.form['insurance_name']
-    insurance_to_delete = Insurance.query.filter_by(name=insurance_name).first()
-    if insurance_to_delete:
-        # Delete all doctor-insurance relationships
-        DoctorInsurance.query.filter_by(insurance_id=insurance_to_delete.id).delete()
-        # Delete the insurance
-        db.session.delete(insurance_to_delete)
-        db.session.commit()
-    return redirect(url_for('management'))
-
-@app.route('/delete_specialty', methods=['POST'])
-@requires_auth
-def delete_specialty():
-    specialty_name = request.form['specialty_name']
-    specialty_to_delete = Specialty.query.filter_by(name=specialty_name).first()
-    if specialty_to_delete:
-        # Delete all doctor-specialty relationships
-        DoctorSpecialty.query.filter_by(specialty_id=specialty_to_delete.id).delete()
-        # Delete the specialty
-        db.session.delete(specialty_to_delete)
-        db.session.commit()
-    return redirect(url_for('management'))
-
-@app.route('/mass_link', methods=['POST'])
-@requires_auth
-def mass_link():
-    insurance_name = request.form['insurance_name']
-    selected_doctors = request.form.getlist('selected_doctors')
-
-    # Check if insurance exists, create if it doesn't
-    insurance = Insurance.query.filter_by(name=insurance_name).first()
-    if not insurance:
-        insurance = Insurance(name=insurance_name)
-        db.session.add(insurance)
-        db.session.flush()
-
-    # Link selected doctors
-    for doctor_name in selected_doctors:
-        doctor = Doctor.query.filter_by(name=doctor_name).first()
-        if doctor:
-            # Check if relationship already exists
-            existing = DoctorInsurance.query.filter_by(
-                doctor_id=doctor.id, 
-                insurance_id=insurance.id
-            ).first()
-            if not existing:
-                new_relationship = DoctorInsurance(
-                    doctor_id=doctor.id, 
-                    insurance_id=insurance.id
-                )
-                db.session.add(new_relationship)
-
-    db.session.commit()
-    return redirect(url_for('management'))
-
-@app.route('/link', methods=['POST'])
-@requires_auth
-def link():
-    import json
-
-    doctor_name = request.form['doctor']
-    insurance_name = request.form['insurance']
-
-    # Load current JSON data
-    with open('doctors_data.json', 'r') as f:
-        data = json.load(f)
-
-    # Find the doctor and add insurance
-    for doctor in data['doctors_specialties']:
-        if doctor['doctor'] == doctor_name:
-            if 'insurances' not in doctor:
-                doctor['insurances'] = []
-            if insurance_name not in doctor['insurances']:
-                doctor['insurances'].append(insurance_name)
-
-    # Save updated JSON
-    with open('doctors_data.json', 'w') as f:
-        json.dump(data, f, indent=2)
-
-    return redirect(url_for('management'))
-
-@app.route('/unlink', methods=['POST'])
-@requires_auth
-def unlink():
-    doctor_name = request.form['doctor']
-    insurance_name = request.form['insurance']
-
-    doctor = Doctor.query.filter_by(name=doctor_name).first()
-    insurance = Insurance.query.filter_by(name=insurance_name).first()
-
-    if doctor and insurance:
-        relationship_to_delete = DoctorInsurance.query.filter_by(doctor_id=doctor.id, insurance_id=insurance.id).first()
-        if relationship_to_delete:
-            db.session.delete(relationship_to_delete)
-            db.session.commit()
-    return redirect(url_for('management'))
-
-@app.route('/link_specialty', methods=['POST'])
-@requires_auth
-def link_specialty():
-    doctor_name = request.form['doctor']
-    specialty_name = request.form['specialty']
-
-    doctor = Doctor.query.filter_by(name=doctor_name).first()
-    specialty = Specialty.query.filter_by(name=specialty_name).first()
-
-    if doctor and specialty:
-        new_specialty_relationship = DoctorSpecialty(doctor_id=doctor.id, specialty_id=specialty.id)
-        db.session.add(new_specialty_relationship)
-        db.session.commit()
-    return redirect(url_for('management'))
-
-@app.route('/unlink_specialty', methods=['POST'])
-@requires_auth
-def unlink_specialty():
-    doctor_name = request.form['doctor']
-    specialty_name = request.form['specialty']
-
-    doctor = Doctor.query.filter_by(name=doctor_name).first()
-    specialty = Specialty.query.filter_by(name=specialty_name).first()
-
-    if doctor and specialty:
-        relationship_to_delete = DoctorSpecialty.query.filter_by(doctor_id=doctor.id, specialty_id=specialty.id).first()
-        if relationship_to_delete:
-            db.session.delete(relationship_to_delete)
-            db.session.commit()
-    return redirect(url_for('management'))
-
-@app.route('/specialties')
-def specialties_page():
-    specialties = [s.name for s in Specialty.query.all()]
-    return render_template_string(specialties_template, specialties=specialties)
-
-@app.route('/specialty/<specialty>')
-def specialty(specialty):
-    doctors = []
-    specialty_obj = Specialty.query.filter_by(name=specialty).first()
-    if specialty_obj:
-        for ds in specialty_obj.doctors:
-            doctor_name = ds.doctor.name
-            insurances = [di.insurance.name for di in ds.doctor.insurances]
-            doctors.append({'doctor': doctor_name, 'insurances': insurances})
-    return jsonify(doctors)
-
-@app.route('/standalone_verify')
-def standalone_verify():
-    import json
-
-    with open('doctors_data.json', 'r') as f:
-        data = json.load(f)
-
-    insurance_query = request.args.get('insurance_query')
-    doctor_query = request.args.get('doctor_query')
-    specialty_query = request.args.get('specialty_query')
-
-    # Get unique doctors, specialties, and insurances from JSON
-    doctors = list(set(d['doctor'] for d in data['doctors_specialties']))
-    specialties = [
-        "Primary Care", "Dermatology (Skin)", "Nephrology (Kidney)",
-        "Pediatrics", "Ophthalmology (Eye)", "Podiatry (feet)",
-        "Vascular (Veins)", "Cardiology (Heart)", "Gastroenterology",
-        "Family Practice", "Urology"
-    ]
-    # Extract unique insurances from all doctors
-    insurances = list(set(
-        ins for d in data['doctors_specialties'] 
-        for ins in d.get('insurances', [])
-    ))
-
-    matching_doctors = []
-
-    # Handle insurance query
-    if insurance_query:
-        for entry in data['doctors_specialties']:
-            if insurance_query in entry.get('insurances', []):
-                matching_doctors.append({
-                    'name': entry['doctor'],
-                    'specialties': entry['specialty'],
-                    'insurances': ', '.join(entry.get('insurances', []))
-                })
-
-    # Handle doctor query
-    elif doctor_query:
-        for entry in data['doctors_specialties']:
-            if entry['doctor'] == doctor_query:
-                matching_doctors.append({
-                    'name': entry['doctor'],
-                    'specialties': entry['specialty'],
-                    'insurances': ', '.join(entry.get('insurances', []))
-                })
-
-    # Handle specialty query
-    elif specialty_query:
-        for entry in data['doctors_specialties']:
-            if specialty_query in entry['specialty'].split(', '):
-                matching_doctors.append({
-                    'name': entry['doctor'],
-                    'specialties': entry['specialty'],
-                    'insurances': ', '.join(entry.get('insurances', []))
-                })
-
-    return render_template_string(
-    """
-<!doctype html>
+standalone_template = """
+<!doctype html>
 <head>
   <title>Insurance Verification - First MedCare</title>
-  <link href="https://fonts.googleapis.com/css2?family=Inter:wght@400;600&display=swap" rel="stylesheet">
+  <link href="{{ asset_url('site.css') }}" rel="stylesheet">
   <style>
-    body {
-      font-family: 'Inter', sans-serif;
-      margin: 0;
-      padding: 0;
-      background: #f8fafc;
-      color: #1e293b;
-    }
     .container {
       max-width: 800px;
       margin: 2rem auto;
@@ -1537,21 +1582,6 @@ def standalone_verify():
     .dropdown-content a:hover {
       background: #f1f5f9;
     }
-    .results {
-      background: #f1f5f9;
-      padding: 1.5rem;
-      border-radius: 0.375rem;
-      margin-top: 2rem;
-    }
-    .results ul {
-      list-style: none;
-      padding: 0;
-      margin: 0;
-    }
-    .results li {
-      padding: 0.5rem 0;
-      color: #475569;
-    }
     .specialty-container {
       width: 100%;
       max-width: 800px;
@@ -1596,7 +1626,7 @@ def standalone_verify():
         <input type="text" onkeyup="filterItems('insurance')" placeholder="Search for insurance...">
         <div class="dropdown-content">
           {% for ins in insurances %}
-            <a href="/standalone_verify?insurance_query={{ ins }}">{{ ins }}</a>
+            <a href="{{ url_for('standalone_verify', insurance_query=ins, specialty_query=specialty_query) }}">{{ ins }}</a>
           {% endfor %}
         </div>
       </div>
@@ -1604,17 +1634,7 @@ def standalone_verify():
       <div id="doctorSearch" class="search-box" style="display: none;">
           <div class="specialty-grid">
             {% for doc in doctors %}
-              {% set doc_specialties = [] %}
-              {% for entry in data['doctors_specialties'] %}
-                {% if entry['doctor'] == doc %}
-                  {% for spec in specialties %}
-                    {% if spec in entry['specialty'].split(', ') %}
-                      {% set _ = doc_specialties.append(loop.index) %}
-                    {% endif %}
-                  {% endfor %}
-                {% endif %}
-              {% endfor %}
-              <button class="specialty-button doctor-button {% if doc_specialties|length == 1 %}doctor-{{ doc_specialties[0] }}{% elif doc_specialties|length == 2 %}doctor-{{ doc_specialties[0] }}-{{ doc_specialties[1] }}{% endif %}" onclick="showDoctorResults('{{ doc }}')">{{ doc }}</button>
+              <button class="specialty-button doctor-button {{ doctor_classes[doc] }}" onclick="showDoctorResults('{{ doc }}')">{{ doc }}</button>
             {% endfor %}
           </div>
       </div>
@@ -1634,33 +1654,25 @@ def standalone_verify():
           overflow: hidden;
           text-overflow: ellipsis;
         }
-        {% for doc in doctors %}
-          {% set doc_specialties = [] %}
-          {% for entry in data['doctors_specialties'] %}
-            {% if entry['doctor'] == doc %}
-              {% for spec in entry['specialty'].split(', ') %}
-                {% set _ = doc_specialties.append(loop.index) %}
-              {% endfor %}
-                {% endif %}
-                {% endfor %}
-                {% if doc_specialties|length == 1 %}
-                .doctor-{{ doc_specialties[0] }} {
-                    background: hsl({{ (doc_specialties[0] * 37) % 360 }}, 70%, 45%);
+        {% for class_name, hues in doctor_styles %}
+                {% if hues|length == 1 %}
+                .{{ class_name }} {
+                    background: hsl({{ hues[0] }}, 70%, 45%);
                 }
-                .doctor-{{ doc_specialties[0] }}:hover {
-                    background: hsl({{ (doc_specialties[0] * 37) % 360 }}, 80%, 40%);
+                .{{ class_name }}:hover {
+                    background: hsl({{ hues[0] }}, 80%, 40%);
                 }
-                {% elif doc_specialties|length == 2 %}
-                .doctor-{{ doc_specialties[0] }}-{{ doc_specialties[1] }} {
+                {% else %}
+                .{{ class_name }} {
                     background: linear-gradient(90deg, 
-                    hsl({{ (doc_specialties[0] * 37) % 360 }}, 70%, 45%) 0%,
-                    hsl({{ (doc_specialties[1] * 37) % 360 }}, 70%, 45%) 100%
+                    hsl({{ hues[0] }}, 70%, 45%) 0%,
+                    hsl({{ hues[1] }}, 70%, 45%) 100%
                     );
                 }
-                .doctor-{{ doc_specialties[0] }}-{{ doc_specialties[1] }}:hover {
+                .{{ class_name }}:hover {
                     background: linear-gradient(90deg, 
-                    hsl({{ (doc_specialties[0] * 37) % 360 }}, 80%, 40%) 0%,
-                    hsl({{ (doc_specialties[1] * 37) % 360 }}, 80%, 40%) 100%
+                    hsl({{ hues[0] }}, 80%, 40%) 0%,
+                    hsl({{ hues[1] }}, 80%, 40%) 100%
                     );
                 }
                 {% endif %}
@@ -1692,23 +1704,6 @@ def standalone_verify():
             </ul>
         </div>
 
-        <style>
-            .doctor-result {
-                background: white;
-                padding: 1rem;
-                margin-bottom: 1rem;
-                border-radius: 0.5rem;
-                box-shadow: 0 1px 3px rgba(0,0,0,0.1);
-            }
-            .doctor-result h4 {
-                margin: 0 0 0.5rem 0;
-                color: #1e293b;
-            }
-            .doctor-result p {
-                margin: 0.25rem 0;
-                color: #4b5563;
-            }
-        </style>
         {% endif %}
     </div>
 
@@ -1736,7 +1731,10 @@ def standalone_verify():
         }
 
         function showResults(specialty) {
-            window.location.href = `/standalone_verify?specialty_query=${encodeURIComponent(specialty)}`;
+            // Narrows a chosen insurance to the doctors with this specialty
+            var params = new URLSearchParams({specialty_query: specialty});
+            {% if insurance_query %}params.set('insurance_query', {{ insurance_query|tojson }});{% endif %}
+            window.location.href = '/standalone_verify?' + params;
         }
 
         function showDoctorResults(doctor) {
@@ -1744,86 +1742,665 @@ def standalone_verify():
         }
     </script>
 </body>
-    """,
-    doctors=doctors,
-    insurances=insurances,
-    specialties=specialties,
-    insurance_query=insurance_query,
-    doctor_query=doctor_query,
-    specialty_query=specialty_query,
-    matching_doctors=matching_doctors,
-    data=data)
+"""
+
+login_template = """
+<head>
+    <link href="{{ asset_url('site.css') }}" rel="stylesheet">
+    <style>
+        body {
+            background-color: #f8fafc;
+            display: flex;
+            flex-direction: column;
+            justify-content: center;
+            align-items: center;
+            height: 100vh;
+            margin: 0;
+        }
+        form {
+            background-color: #fff;
+            padding: 20px;
+            border-radius: 8px;
+            box-shadow: 0 4px 8px rgba(0, 0, 0, 0.1);
+            display: flex;
+            flex-direction: column;
+            width: 300px;
+            margin-bottom: 1rem;
+        }
+        input {
+            margin: 10px 0;
+            padding: 8px;
+            border: 1px solid #ddd;
+            border-radius: 4px;
+        }
+        button {
+            background-color: #3b82f6;
+            color: white;
+            padding: 10px 15px;
+            border: none;
+            border-radius: 4px;
+            cursor: pointer;
+            transition: background-color 0.2s;
+        }
+        button:hover {
+            background-color: #2563eb;
+        }
+    </style>
+</head>
+<form method="post">
+    <input type="password" name="password" placeholder="Password">
+    <button type="submit">Login</button>
+</form>
+<a href="/" style="text-decoration: none;">
+    <button style="background-color: #64748b; padding: 10px 15px; border: none; border-radius: 4px; color: white; cursor: pointer; transition: background-color 0.2s;">
+        Back to Home
+    </button>
+</a>
+"""
+
+login_failed_template = '''<p>Incorrect password</p><a href="{{ url_for("login") }}">Try again</a>'''
+
+# Templates are registered once; Jinja compiles each on first use and keeps the
+# compiled Template in its cache. PRECOMPILE_TEMPLATES=1 compiles them all at
+# startup so the first request after a worker boots doesn't pay for it.
+page_templates = {
+    'index.html': html_template,
+    'login.html': login_template,
+    'login_failed.html': login_failed_template,
+    'management.html': management_template,
+    'specialties.html': specialties_template,
+    'query_page.html': query_template,
+    'standalone_verify.html': standalone_template,
+}
+app.jinja_loader = DictLoader(page_templates)
+
+def precompile_templates():
+    for name in page_templates:
+        app.jinja_env.get_template(name)
+
+if os.environ.get('PRECOMPILE_TEMPLATES'):
+    precompile_templates()
+
+@app.route('/')
+@page_cache.cached(provider_directory.current_version)
+def index():
+    return render_template('index.html')
+
+@app.route('/login', methods=['GET', 'POST'])
+def login():
+    if request.method == 'POST':
+        if request.form['password'] == 'FMC8707$':
+            response = redirect(url_for('management'))
+            # The cookie only carries the session token; it is set once per
+            # login and never rewritten, the expiry lives in the store
+            response.set_cookie(
+                app.config['AUTH_SESSION_COOKIE'], session_store.create(),
+                httponly=True, samesite='Lax', secure=request.is_secure
+            )
+            return response
+        else:
+            return render_template('login_failed.html')
+    return render_template('login.html')
+
+@app.route('/logout')
+def logout():
+    cookie = app.config['AUTH_SESSION_COOKIE']
+    session_store.revoke(request.cookies.get(cookie))
+    response = redirect(url_for('index'))
+    response.delete_cookie(cookie)
+    return response
+
+@app.route('/management', methods=['GET', 'POST'])
+@requires_auth
+def management():
+    # Just the shell: the lists load page by page from management_page()
+    return render_template('management.html')
+
+def _relationship_rows(data, key):
+    for entry in data['doctors_specialties']:
+        for name in entry.get('insurances', []):
+            yield {'doctor': entry['doctor'], key: name}
+
+def _specialty_relationship_rows(data, key):
+    for entry in data['doctors_specialties']:
+        if entry['specialty']:
+            for name in entry['specialty'].split(', '):
+                yield {'doctor': entry['doctor'], key: name}
+
+MANAGEMENT_LISTS = {
+    'doctors': lambda data, index: [{'doctor_name': name} for name in index.doctors],
+    'insurances': lambda data, index: [{'insurance_name': name} for name in data['insurances']],
+    'specialties': lambda data, index: [{'specialty_name': name} for name in data['specialties'] if name],
+    'relationships': lambda data, index: list(_relationship_rows(data, 'insurance')),
+    'specialty_relationships': lambda data, index: list(_specialty_relationship_rows(data, 'specialty')),
+}
+MANAGEMENT_PAGE_SIZE = 100
+MAX_MANAGEMENT_PAGE_SIZE = 500
+
+@lru_cache(maxsize=len(MANAGEMENT_LISTS))
+def management_rows(kind, version):
+    # Built once per directory version; version is only part of the cache key
+    return MANAGEMENT_LISTS[kind](provider_directory.get(), provider_directory.index())
+
+@lru_cache(maxsize=64)
+def filtered_management_rows(kind, version, query):
+    # Cached so scrolling a filtered list only filters it once
+    rows = management_rows(kind, version)
+    return [row for row in rows if any(query in value.casefold() for value in row.values())] if query else rows
+
+@app.route('/api/management/<kind>')
+@requires_auth
+def management_page(kind):
+    """One page of a management list.
+
+    ?offset=0&limit=100[&q=<text>] returns {"items": [...], "next": offset of
+    the following page or null}. q keeps only rows containing that text.
+    """
+    if kind not in MANAGEMENT_LISTS:
+        return jsonify(error=f"Unknown list {kind!r}"), 404
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = max(1, min(request.args.get('limit', MANAGEMENT_PAGE_SIZE, type=int), MAX_MANAGEMENT_PAGE_SIZE))
+    query = request.args.get('q', '').strip().casefold()
+
+    with request_metrics.phase('load'):
+        version = provider_directory.current_version()
+    with request_metrics.phase('lookup'):
+        rows = filtered_management_rows(kind, version, query)
+    items = rows[offset:offset + limit]
+    return jsonify(items=items, next=offset + limit if offset + limit < len(rows) else None)
+
+@app.route('/add_doctor', methods=['POST'])
+@requires_auth
+def add_doctor():
+    doctor_name = request.form['doctor_name']
+    new_doctor = Doctor(name=doctor_name)
+    db.session.add(new_doctor)
+    db.session.commit()
+    record_change('add_doctor', doctor=doctor_name)
+    return redirect(url_for('management'))
+
+@app.route('/add_insurance', methods=['POST'])
+@requires_auth
+def add_insurance():
+    insurance_name = request.form['insurance_name']
+    new_insurance = Insurance(name=insurance_name)
+    db.session.add(new_insurance)
+    db.session.commit()
+    record_change('add_insurance', insurance=insurance_name)
+    return redirect(url_for('management'))
+
+@app.route('/add_specialty', methods=['POST'])
+@requires_auth
+def add_specialty():
+    try:
+        specialty_name = request.form['specialty_name']
+        if specialty_name:
+            new_specialty = Specialty(name=specialty_name)
+            db.session.add(new_specialty)
+            db.session.commit()
+            record_change('add_specialty', specialty=specialty_name)
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error adding specialty: {e}")
+    return redirect(url_for('management'))
+
+@app.route('/delete_doctor', methods=['POST'])
+@requires_auth
+def delete_doctor():
+    doctor_name = request.form['doctor_name']
+    doctor_to_delete = Doctor.query.filter_by(name=doctor_name).first()
+    if doctor_to_delete:
+        # Delete all doctor-insurance relationships
+        DoctorInsurance.query.filter_by(doctor_id=doctor_to_delete.id).delete()
+        # Delete all doctor-specialty relationships
+        DoctorSpecialty.query.filter_by(doctor_id=doctor_to_delete.id).delete()
+        # Delete the doctor
+        db.session.delete(doctor_to_delete)
+        db.session.commit()
+        record_change('delete_doctor', doctor=doctor_name)
+    return redirect(url_for('management'))
+
+@app.route('/delete_insurance', methods=['POST'])
+@requires_auth
+def delete_insurance():
+    insurance_name = request.form['insurance_name']
+    insurance_to_delete = Insurance.query.filter_by(name=insurance_name).first()
+    if insurance_to_delete:
+        # Delete all doctor-insurance relationships
+        DoctorInsurance.query.filter_by(insurance_id=insurance_to_delete.id).delete()
+        # Delete the insurance
+        db.session.delete(insurance_to_delete)
+        db.session.commit()
+        record_change('delete_insurance', insurance=insurance_name)
+    return redirect(url_for('management'))
+
+@app.route('/delete_specialty', methods=['POST'])
+@requires_auth
+def delete_specialty():
+    specialty_name = request.form['specialty_name']
+    specialty_to_delete = Specialty.query.filter_by(name=specialty_name).first()
+    if specialty_to_delete:
+        # Delete all doctor-specialty relationships
+        DoctorSpecialty.query.filter_by(specialty_id=specialty_to_delete.id).delete()
+        # Delete the specialty
+        db.session.delete(specialty_to_delete)
+        db.session.commit()
+        record_change('delete_specialty', specialty=specialty_name)
+    return redirect(url_for('management'))
+
+@app.route('/mass_link', methods=['POST'])
+@requires_auth
+def mass_link():
+    insurance_name = request.form['insurance_name']
+    selected_doctors = request.form.getlist('selected_doctors')
+
+    # Check if insurance exists, create if it doesn't
+    insurance_id = get_or_create_ids(Insurance, [insurance_name])[insurance_name]
+
+    # One bulk insert; links that already exist (or land concurrently) are skipped
+    insert_links(DoctorInsurance, 'insurance_id',
+                 [(doctor_id, insurance_id) for doctor_id in doctor_ids_by_name(selected_doctors)])
+
+    db.session.commit()
+    record_change('mass_link', insurance=insurance_name, doctors=selected_doctors)
+    return redirect(url_for('management'))
+
+@app.route('/mass_unlink', methods=['POST'])
+@requires_auth
+def mass_unlink():
+    insurance_name = request.form['insurance_name']
+    selected_doctors = request.form.getlist('selected_doctors')
+
+    insurance = Insurance.query.filter_by(name=insurance_name).first()
+    if insurance:
+        bulk_unlink(DoctorInsurance, 'insurance_id', insurance.id, doctor_ids_by_name(selected_doctors))
+        db.session.commit()
+        record_change('mass_unlink', insurance=insurance_name, doctors=selected_doctors)
+    return redirect(url_for('management'))
+
+@app.route('/mass_link_specialty', methods=['POST'])
+@requires_auth
+def mass_link_specialty():
+    specialty_name = request.form['specialty_name']
+    selected_doctors = request.form.getlist('selected_doctors')
+
+    specialty_id = get_or_create_ids(Specialty, [specialty_name])[specialty_name]
+    insert_links(DoctorSpecialty, 'specialty_id',
+                 [(doctor_id, specialty_id) for doctor_id in doctor_ids_by_name(selected_doctors)])
+
+    db.session.commit()
+    record_change('mass_link_specialty', specialty=specialty_name, doctors=selected_doctors)
+    return redirect(url_for('management'))
+
+@app.route('/mass_unlink_specialty', methods=['POST'])
+@requires_auth
+def mass_unlink_specialty():
+    specialty_name = request.form['specialty_name']
+    selected_doctors = request.form.getlist('selected_doctors')
+
+    specialty = Specialty.query.filter_by(name=specialty_name).first()
+    if specialty:
+        bulk_unlink(DoctorSpecialty, 'specialty_id', specialty.id, doctor_ids_by_name(selected_doctors))
+        db.session.commit()
+        record_change('mass_unlink_specialty', specialty=specialty_name, doctors=selected_doctors)
+    return redirect(url_for('management'))
+
+@app.route('/import_roster', methods=['POST'])
+@requires_auth
+def import_roster_upload():
+    roster = request.files.get('roster')
+    if not roster or not roster.filename:
+        return jsonify(error="Upload a CSV/XLSX file in the 'roster' field"), 400
+    try:
+        report = import_roster(roster.stream, roster.filename)
+    except RosterError as e:
+        db.session.rollback()
+        return jsonify(error=str(e)), 400
+    return jsonify(report)
+
+@app.route('/sync_roster', methods=['POST'])
+@requires_auth
+def sync_roster_upload():
+    roster = request.files.get('roster')
+    if not roster or not roster.filename:
+        return jsonify(error="Upload a CSV/XLSX file in the 'roster' field"), 400
+    try:
+        report = sync_roster(
+            roster.stream, roster.filename,
+            insurance=request.form.get('insurance') or None,
+            dry_run=bool(request.form.get('dry_run'))
+        )
+    except RosterError as e:
+        db.session.rollback()
+        return jsonify(error=str(e)), 400
+    return jsonify(report)
+
+@app.route('/link', methods=['POST'])
+@requires_auth
+def link():
+    doctor_name = request.form['doctor']
+    insurance_name = request.form['insurance']
+
+    doctor = Doctor.query.filter_by(name=doctor_name).first()
+
+    if doctor and insurance_name:
+        # The plan is typed in freely, so a new one is created like in mass_link
+        insurance_id = get_or_create_ids(Insurance, [insurance_name])[insurance_name]
+        if insert_links(DoctorInsurance, 'insurance_id', [(doctor.id, insurance_id)]):
+            db.session.commit()
+            record_change('link', doctor=doctor_name, insurance=insurance_name)
+    return redirect(url_for('management'))
+
+@app.route('/unlink', methods=['POST'])
+@requires_auth
+def unlink():
+    doctor_name = request.form['doctor']
+    insurance_name = request.form['insurance']
+
+    doctor = Doctor.query.filter_by(name=doctor_name).first()
+    insurance = Insurance.query.filter_by(name=insurance_name).first()
+
+    if doctor and insurance:
+        relationship_to_delete = DoctorInsurance.query.filter_by(doctor_id=doctor.id, insurance_id=insurance.id).first()
+        if relationship_to_delete:
+            db.session.delete(relationship_to_delete)
+            db.session.commit()
+            record_change('unlink', doctor=doctor_name, insurance=insurance_name)
+    return redirect(url_for('management'))
+
+@app.route('/link_specialty', methods=['POST'])
+@requires_auth
+def link_specialty():
+    doctor_name = request.form['doctor']
+    specialty_name = request.form['specialty']
+
+    doctor = Doctor.query.filter_by(name=doctor_name).first()
+    specialty = Specialty.query.filter_by(name=specialty_name).first()
+
+    if doctor and specialty:
+        existing = DoctorSpecialty.query.filter_by(doctor_id=doctor.id, specialty_id=specialty.id).first()
+        if not existing:
+            new_specialty_relationship = DoctorSpecialty(doctor_id=doctor.id, specialty_id=specialty.id)
+            db.session.add(new_specialty_relationship)
+            db.session.commit()
+            record_change('link_specialty', doctor=doctor_name, specialty=specialty_name)
+    return redirect(url_for('management'))
+
+@app.route('/unlink_specialty', methods=['POST'])
+@requires_auth
+def unlink_specialty():
+    doctor_name = request.form['doctor']
+    specialty_name = request.form['specialty']
+
+    doctor = Doctor.query.filter_by(name=doctor_name).first()
+    specialty = Specialty.query.filter_by(name=specialty_name).first()
+
+    if doctor and specialty:
+        relationship_to_delete = DoctorSpecialty.query.filter_by(doctor_id=doctor.id, specialty_id=specialty.id).first()
+        if relationship_to_delete:
+            db.session.delete(relationship_to_delete)
+            db.session.commit()
+            record_change('unlink_specialty', doctor=doctor_name, specialty=specialty_name)
+    return redirect(url_for('management'))
+
+@app.route('/journal')
+@requires_auth
+def journal_entries():
+    """Journal entries after ?after=<offset>; poll again from 'next' to catch up."""
+    if journal is None:
+        return jsonify(error="The journal is disabled"), 404
+    after = request.args.get('after', 0, type=int)
+    limit = min(request.args.get('limit', 1000, type=int), 1000)
+    if not journal.is_boundary(after):
+        return jsonify(error="'after' must be an offset returned by this endpoint"), 400
+    if limit < 1:
+        return jsonify(error="'limit' must be at least 1"), 400
+    entries = []
+    next_offset = after
+    for offset, next_offset, entry in journal.read(after, limit):
+        entries.append(dict(entry, offset=offset))
+    return jsonify(entries=entries, next=next_offset, end=journal.end())
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus scrape endpoint."""
+    return Response(request_metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/directory_stats')
+@requires_auth
+def directory_stats():
+    return jsonify(
+        directory=provider_directory.stats(),
+        page_cache=page_cache.stats(),
+        search_cache=search_cache.stats(),
+        query_engine=query_engine.stats(),
+        static_assets=static_assets.stats(),
+        active_sessions=session_store.count()
+    )
+
+@app.route('/specialties')
+@page_cache.cached(provider_directory.current_version)
+def specialties_page():
+    return render_template('specialties.html', specialties=provider_directory.index().taxonomy.names)
+
+@app.route('/api/specialties')
+@search_cache.cached(provider_directory.current_version)
+def api_specialties():
+    """The specialty taxonomy: [{"id", "name", "aliases", "doctors"}, ...]."""
+    taxonomy = provider_directory.index().taxonomy
+    return jsonify(specialties=[
+        {'id': s.id, 'name': s.name, 'aliases': list(s.aliases), 'doctors': s.doctors}
+        for s in taxonomy.specialties
+    ])
+
+@app.route('/specialty/<specialty>')
+@page_cache.cached(database_version)
+def specialty(specialty):
+    # An alias ("Kidney") or another spelling finds the same specialty
+    taxonomy = provider_directory.index().taxonomy
+    members = taxonomy.members(taxonomy.resolve(specialty))
+    # One query for the whole specialty -> doctor -> insurance graph, so the
+    # number of queries doesn't grow with the number of doctors
+    rows = db.session.execute(
+        db.select(DoctorSpecialty.id, Doctor.name, Insurance.name)
+        .join(Doctor, Doctor.id == DoctorSpecialty.doctor_id)
+        .join(Specialty, Specialty.id == DoctorSpecialty.specialty_id)
+        .outerjoin(DoctorInsurance, DoctorInsurance.doctor_id == Doctor.id)
+        .outerjoin(Insurance, Insurance.id == DoctorInsurance.insurance_id)
+        .where(Specialty.name.in_(members))
+        .order_by(Specialty.id, DoctorSpecialty.id, DoctorInsurance.id)
+    )
+    doctors = {}
+    # A doctor listed under two spellings keeps its first entry
+    first_link = {}
+    for link_id, doctor_name, insurance_name in rows:
+        if first_link.setdefault(doctor_name, link_id) != link_id:
+            continue
+        insurances = doctors.setdefault(doctor_name, [])
+        if insurance_name is not None:
+            insurances.append(insurance_name)
+    return jsonify([{'doctor': name, 'insurances': insurances} for name, insurances in doctors.items()])
+
+# Upper bound on questions per /api/verify call
+MAX_VERIFY_CHECKS = 1000
+
+def verify_check(index, check):
+    if not isinstance(check, dict) or not check.get('insurance'):
+        return {'error': "Each check needs an 'insurance' and a 'doctor' or 'specialty'"}
+    for field in ('insurance', 'doctor', 'specialty'):
+        if check.get(field) is not None and not isinstance(check[field], str):
+            return {'error': f"'{field}' must be a string"}
+    insurance = check['insurance']
+    if check.get('doctor'):
+        doctor = check['doctor']
+        return {
+            'doctor': doctor,
+            'insurance': insurance,
+            'known_doctor': doctor in index.by_doctor,
+            'accepted': index.accepts(doctor, insurance)
+        }
+    if check.get('specialty'):
+        specialty = check['specialty']
+        doctors = [match['name'] for match in query_engine.search(Criteria(insurance, specialty=specialty))]
+        return {'specialty': specialty, 'insurance': insurance, 'accepted': bool(doctors), 'doctors': doctors}
+    return {'error': "Each check needs an 'insurance' and a 'doctor' or 'specialty'"}
+
+@app.route('/api/verify', methods=['POST'])
+def api_verify():
+    """Answer a batch of (doctor, insurance) / (specialty, insurance) checks.
+
+    Body: {"checks": [{"doctor": ..., "insurance": ...},
+                      {"specialty": ..., "insurance": ...}, ...]}
+    Results come back in the same order as the checks.
+    """
+    payload = request.get_json(silent=True)
+    checks = payload.get('checks') if isinstance(payload, dict) else None
+    if not isinstance(checks, list):
+        return jsonify(error="Expected a JSON body with a 'checks' list"), 400
+    if len(checks) > MAX_VERIFY_CHECKS:
+        return jsonify(error=f"At most {MAX_VERIFY_CHECKS} checks per request"), 400
+
+    with request_metrics.phase('load'):
+        index = provider_directory.index()
+    with request_metrics.phase('lookup'):
+        results = [verify_check(index, check) for check in checks]
+    return jsonify(version=provider_directory.version, results=results)
+
+@app.route('/api/search')
+@search_cache.cached(provider_directory.current_version)
+def api_search():
+    """Doctors matching every given criterion.
+
+    ?insurance=&doctor=&specialty= (any combination, at least one) returns
+    {"version", "results": [{"name", "specialties", "insurances"}, ...]}.
+    """
+    criteria = Criteria.from_args(request.args, suffix='')
+    if not criteria:
+        return jsonify(error="Give at least one of insurance, doctor or specialty"), 400
+    with request_metrics.phase('lookup'):
+        results = query_engine.search(criteria)
+    return jsonify(version=provider_directory.version, results=results)
+
+MAX_TYPEAHEAD_RESULTS = 50
+TYPEAHEAD_KINDS = ('doctor', 'insurance', 'specialty')
+
+@app.route('/api/typeahead')
+@search_cache.cached(provider_directory.current_version)
+def api_typeahead():
+    """Suggest doctor, plan and specialty names for a partly typed query.
+
+    ?q=<text>[&limit=10][&kind=doctor|insurance|specialty, repeatable]
+    Returns {"results": [{"kind", "name", "score"}, ...]}, best match first.
+    """
+    query = request.args.get('q', '')
+    limit = max(1, min(request.args.get('limit', 10, type=int), MAX_TYPEAHEAD_RESULTS))
+    kinds = [kind for kind in request.args.getlist('kind') if kind]
+    if any(kind not in TYPEAHEAD_KINDS for kind in kinds):
+        return jsonify(error=f"kind must be one of {', '.join(TYPEAHEAD_KINDS)}"), 400
+    with request_metrics.phase('load'):
+        typeahead = provider_directory.index().typeahead
+    with request_metrics.phase('lookup'):
+        results = typeahead.search(query, limit, kinds)
+    return jsonify(query=query, results=results)
+
+class _Echo:
+    """File-like object for csv.writer that hands each line straight back."""
+
+    def write(self, line):
+        return line
+
+def export_rows(data, insurance=None, specialties=()):
+    """Yield the header, then one row per (doctor, insurance, specialty).
+
+    specialties is every spelling of the wanted specialty, as given by
+    SpecialtyTaxonomy.members(); empty means all of them.
+    """
+    yield ('doctor', 'insurance', 'specialty')
+    for entry in data['doctors_specialties']:
+        insurances = entry.get('insurances', [])
+        specs = entry['specialty'].split(', ') if entry['specialty'] else []
+        if insurance:
+            if insurance not in insurances:
+                continue
+            insurances = [insurance]
+        if specialties:
+            specs = [spec for spec in specs if spec in specialties]
+            if not specs:
+                continue
+        for ins in insurances or ['']:
+            for spec in specs or ['']:
+                yield (entry['doctor'], ins, spec)
+
+@app.route('/export')
+def export():
+    """Stream the doctor-insurance-specialty matrix as NDJSON or CSV.
+
+    One row per (doctor, insurance, specialty); optional ?insurance= and
+    ?specialty= filters. Rows are generated one at a time, so memory use
+    doesn't grow with the roster and the first row goes out immediately.
+    """
+    export_format = request.args.get('format', 'ndjson')
+    if export_format not in ('ndjson', 'csv'):
+        return jsonify(error="format must be 'ndjson' or 'csv'"), 400
+    specialty = request.args.get('specialty')
+    # ?specialty=Kidney exports Nephrology (Kidney), as on the verify pages
+    taxonomy = provider_directory.index().taxonomy
+    specialties = taxonomy.members(taxonomy.resolve(specialty)) if specialty else ()
+    rows = export_rows(
+        provider_directory.get(),
+        insurance=request.args.get('insurance'),
+        specialties=specialties
+    )
+
+    if export_format == 'csv':
+        writer = csv.writer(_Echo())
+        body = (writer.writerow(row) for row in rows)
+        mimetype = 'text/csv'
+    else:
+        header = next(rows)
+        body = (json.dumps(dict(zip(header, row))) + '\n' for row in rows)
+        mimetype = 'application/x-ndjson'
+    response = Response(body, mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename=directory.{export_format}'
+    return response
+
+def render_verify_page(template):
+    """Render query_page/standalone_verify; they differ only in layout."""
+    with request_metrics.phase('load'):
+        index = provider_directory.index()
+    with request_metrics.phase('lookup'):
+        # ?specialty_query=Kidney shows Nephrology (Kidney)
+        criteria = query_engine.normalize(Criteria.from_args(request.args))
+        # Button and color order come from the directory's taxonomy
+        specialties = index.taxonomy.names
+        doctor_classes, doctor_styles = index.doctor_colors(specialties)
+        matching_doctors = query_engine.search(criteria)
+
+    return render_template(template,
+                           doctors=index.doctors,
+                           insurances=index.insurances,
+                           specialties=specialties,
+                           insurance_query=criteria.insurance,
+                           doctor_query=criteria.doctor,
+                           specialty_query=criteria.specialty,
+                           matching_doctors=matching_doctors,
+                           doctor_classes=doctor_classes,
+                           doctor_styles=doctor_styles)
+
+@app.route('/standalone_verify')
+@page_cache.cached(provider_directory.current_version)
+def standalone_verify():
+    return render_verify_page('standalone_verify.html')
 
 @app.route('/query_page')
+@page_cache.cached(provider_directory.current_version)
 def query_page():
-    import json
-
-    with open('doctors_data.json', 'r') as f:
-        data = json.load(f)
-
-    insurance_query = request.args.get('insurance_query')
-    doctor_query = request.args.get('doctor_query')
-    specialty_query = request.args.get('specialty_query')
-
-    # Get unique doctors, specialties, and insurances from JSON
-    doctors = list(set(d['doctor'] for d in data['doctors_specialties']))
-    specialties = [
-        "Primary Care", "Dermatology (Skin)", "Nephrology (Kidney)",
-        "Pediatrics", "Ophthalmology (Eye)", "Podiatry (feet)",
-        "Vascular (Veins)", "Cardiology (Heart)", "Gastroenterology",
-        "Family Practice", "Urology"
-    ]
-    # Extract unique insurances from all doctors
-    insurances = list(set(
-        ins for d in data['doctors_specialties'] 
-        for ins in d.get('insurances', [])
-    ))
-
-    matching_doctors = []
-
-    # Handle all queries
-    if insurance_query:
-        for entry in data['doctors_specialties']:
-            if insurance_query in entry.get('insurances', []):
-                matching_doctors.append({
-                    'name': entry['doctor'],
-                    'specialties': entry['specialty'],
-                    'insurances': ', '.join(entry.get('insurances', []))
-                })
-
-    # Handle doctor query
-    elif doctor_query:
-        for entry in data['doctors_specialties']:
-            if entry['doctor'] == doctor_query:
-                matching_doctors.append({
-                    'name': entry['doctor'],
-                    'specialties': entry['specialty'],
-                    'insurances': ', '.join(entry.get('insurances', []))
-                })
-
-    # Handle specialty query
-    elif specialty_query:
-        for entry in data['doctors_specialties']:
-            if specialty_query in entry['specialty'].split(', '):
-                matching_doctors.append({
-                    'name': entry['doctor'],
-                    'specialties': entry['specialty'],
-                    'insurances': ', '.join(entry.get('insurances', []))
-                })
-
-    return render_template_string(query_template,
-                               doctors=doctors,
-                               insurances=insurances,
-                               specialties=specialties,
-                               insurance_query=insurance_query,
-                               doctor_query=doctor_query,
-                               specialty_query=specialty_query,
-                               matching_doctors=matching_doctors,
-                               data=data)
+    return render_verify_page('query_page.html')
 
 # Initialize database
 with app.app_context():
-    db.create_all()
+    create_tables()
+    import_json_once()
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,143 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from flask import before_render_template, g, has_request_context, request, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100, 250)
+
+
+def _label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Histogram:
+    """A Prometheus histogram family; one series per combination of labels.
+
+    observe() is a bisect and a few additions, so recording costs the same
+    whether or not anything is scraping. Cumulative counts are only worked
+    out in render().
+    """
+
+    def __init__(self, name, documentation, labels, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_values, value):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                # Per-bucket counts, then +Inf, sum and count
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            series[bisect_left(self.buckets, value)] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = sorted((labels, list(values)) for labels, values in self._series.items())
+        for label_values, values in series:
+            labels = ','.join(f'{name}="{_label_value(value)}"' for name, value in zip(self.labels, label_values))
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), values):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{labels}}} {values[-2]}')
+            lines.append(f'{self.name}_count{{{labels}}} {values[-1]}')
+        return lines
+
+
+class RequestMetrics:
+    """Per-route latency, phase timing, response size and SQL query counts.
+
+    Rendering and SQL time are picked up from Flask's template signals and
+    SQLAlchemy's cursor events; other phases are marked in the views with
+    phase(). Everything is kept in memory and turned into the Prometheus
+    text format by render().
+    """
+
+    def __init__(self, prefix='fmc'):
+        self.latency = Histogram(
+            f'{prefix}_http_request_duration_seconds', 'Time spent handling requests.',
+            ('endpoint', 'method', 'status'), LATENCY_BUCKETS)
+        self.phases = Histogram(
+            f'{prefix}_http_request_phase_seconds', 'Time spent in each phase of a request.',
+            ('endpoint', 'phase'), LATENCY_BUCKETS)
+        self.sizes = Histogram(
+            f'{prefix}_http_response_size_bytes', 'Size of response bodies.',
+            ('endpoint',), SIZE_BUCKETS)
+        self.queries = Histogram(
+            f'{prefix}_http_request_sql_queries', 'SQL statements executed per request.',
+            ('endpoint',), QUERY_BUCKETS)
+
+    def init_app(self, app):
+        app.before_request(self._start)
+        app.after_request(self._finish)
+        before_render_template.connect(self._render_started, app)
+        template_rendered.connect(self._render_finished, app)
+        event.listen(Engine, 'before_cursor_execute', self._query_started)
+        event.listen(Engine, 'after_cursor_execute', self._query_finished)
+
+    def _start(self):
+        g.metrics_start = time.perf_counter()
+        g.metrics_phases = {}
+        g.metrics_queries = 0
+
+    def _finish(self, response):
+        start = g.pop('metrics_start', None)
+        if start is None:
+            return response
+        endpoint = request.endpoint or 'unmatched'
+        self.latency.observe((endpoint, request.method, response.status_code), time.perf_counter() - start)
+        for phase, seconds in g.metrics_phases.items():
+            self.phases.observe((endpoint, phase), seconds)
+        self.queries.observe((endpoint,), g.metrics_queries)
+        # Streamed responses have no length up front
+        if response.content_length is not None:
+            self.sizes.observe((endpoint,), response.content_length)
+        return response
+
+    def add(self, phase, seconds):
+        if has_request_context() and 'metrics_phases' in g:
+            g.metrics_phases[phase] = g.metrics_phases.get(phase, 0.0) + seconds
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def _render_started(self, sender, template, context, **extra):
+        if has_request_context():
+            g.metrics_render_start = time.perf_counter()
+
+    def _render_finished(self, sender, template, context, **extra):
+        if has_request_context() and 'metrics_render_start' in g:
+            self.add('render', time.perf_counter() - g.pop('metrics_render_start'))
+
+    def _query_started(self, conn, cursor, statement, parameters, context, executemany):
+        if has_request_context() and 'metrics_queries' in g:
+            g.metrics_queries += 1
+            g.metrics_query_start = time.perf_counter()
+
+    def _query_finished(self, conn, cursor, statement, parameters, context, executemany):
+        if has_request_context() and 'metrics_query_start' in g:
+            self.add('sql', time.perf_counter() - g.pop('metrics_query_start'))
+
+    def render(self):
+        lines = []
+        for histogram in (self.latency, self.phases, self.sizes, self.queries):
+            lines.extend(histogram.render())
+        return '\n'.join(lines) + '\n'
@@ -1,53 +1,137 @@
 
+import argparse
+import time
+
 import docx
-import json
-
-def populate_database():
-    # Read the Word document
-    doc = docx.Document('attached_assets/doctors and specialties.docx')
-    
-    # Get all paragraphs
-    content = [p.text.strip() for p in doc.paragraphs if p.text.strip()]
-    
-    doctors_specialties = []
-    doctors_started = False
-    current_index = 0
-    
-    # Find where doctors section starts
-    for i, line in enumerate(content):
-        if line.lower().startswith('doctors:'):
-            doctors_started = True
-            current_index = i + 1
-            break
-    
-    # Match doctors with specialties
-    if doctors_started:
-        doctors = []
-        specialties = []
-        
-        # Split content into doctors and specialties
-        for line in content[current_index:]:
-            if not line:  # Skip empty lines
-                continue
-            if ':' in line:  # Skip headers
-                continue
-            if len(doctors) == 0:  # First column is doctors
-                doctors.append(line.strip())
-            else:  # Second column is specialties
-                specialties.append(line.strip())
-        
-        # Create doctor-specialty pairs
-        for i in range(min(len(doctors), len(specialties))):
-            doctors_specialties.append({
-                "doctor": doctors[i],
-                "specialty": specialties[i]
-            })
-    
-    # Save to JSON file
-    with open('doctors_data.json', 'w') as f:
-        json.dump({"doctors_specialties": doctors_specialties}, f, indent=2)
-        
-    print("JSON file created successfully!")
+from docx.oxml.ns import qn
+from docx.table import Table
+from docx.text.paragraph import Paragraph
+
+from main import app, new_import_report, upsert_records
+from roster import RosterError, map_header, record_error, split_values
+
+DEFAULT_PATH = 'attached_assets/doctors and specialties.docx'
+
+
+def iter_blocks(doc):
+    # Paragraphs and tables in document order, wrapped one at a time
+    for child in doc.element.body.iterchildren():
+        if child.tag == qn('w:p'):
+            yield Paragraph(child, doc)
+        elif child.tag == qn('w:tbl'):
+            yield Table(child, doc)
+
+
+def _record(doctor, insurances='', specialties=''):
+    return {
+        'doctor': doctor.strip(),
+        'insurances': split_values(insurances),
+        'specialties': split_values(specialties),
+    }
+
+
+def iter_table_records(table, number):
+    """Yield (position, record, error) for the rows of one table."""
+    rows = iter(table.rows)
+    first = next(rows, None)
+    if first is None:
+        return
+    cells = [cell.text.strip() for cell in first.cells]
+    try:
+        positions = map_header(cells)
+        start = 2
+    except RosterError:
+        # No recognizable header: the layout is doctor | specialty [| insurance]
+        positions = {'doctor': 0, 'specialty': 1, 'insurance': 2}
+        rows = _chain(first, rows)
+        start = 1
+
+    for row_number, row in enumerate(rows, start):
+        cells = [cell.text.strip() for cell in row.cells]
+        if not any(cells):
+            continue
+
+        def cell(column):
+            position = positions.get(column)
+            return cells[position] if position is not None and position < len(cells) else ''
+
+        record = _record(cell('doctor'), cell('insurance'), cell('specialty'))
+        error = record_error(record)
+        yield f"table {number}, row {row_number}", None if error else record, error
+
+
+def _chain(first, rows):
+    yield first
+    yield from rows
+
+
+def paragraph_record(paragraph, in_doctors):
+    # "Doctor<TAB>Specialty[<TAB>Insurances]" lines after a "Doctors:"
+    # heading give (record, error); other paragraphs None
+    text = paragraph.text.strip()
+    if not in_doctors or not text or ':' in text:
+        return None
+    columns = [column.strip() for column in text.split('\t') if column.strip()]
+    if len(columns) < 2:
+        return None, "expected Doctor<TAB>Specialty[<TAB>Insurances]"
+    record = _record(columns[0], columns[2] if len(columns) > 2 else '', columns[1])
+    error = record_error(record)
+    return None if error else record, error
+
+
+def iter_records(path):
+    """Yield (position, record, error) for the tables and paragraphs of a docx, in order."""
+    doc = docx.Document(path)
+    in_doctors = False
+    tables = paragraphs = 0
+    for block in iter_blocks(doc):
+        if isinstance(block, Table):
+            tables += 1
+            yield from iter_table_records(block, tables)
+            continue
+        paragraphs += 1
+        text = block.text.strip()
+        if text.lower().startswith('doctors:'):
+            in_doctors = True
+            continue
+        parsed = paragraph_record(block, in_doctors)
+        if parsed:
+            yield (f"paragraph {paragraphs}", *parsed)
+
+
+def populate_database(path=DEFAULT_PATH, chunk_size=500):
+    report = new_import_report()
+
+    def accepted():
+        for position, record, error in iter_records(path):
+            if error:
+                report['rejected'].append({'position': position, 'error': error})
+            else:
+                yield record
+
+    start = time.perf_counter()
+    with app.app_context():
+        upsert_records(accepted(), report, chunk_size)
+    elapsed = time.perf_counter() - start
+
+    rate = report['rows'] / elapsed if elapsed else 0
+    print(
+        f"Ingested {report['rows']} rows in {elapsed:.2f}s ({rate:.0f} rows/s), "
+        f"{len(report['rejected'])} rejected"
+    )
+    print(
+        f"Added {report['doctors_added']} doctors, {report['insurances_added']} insurances, "
+        f"{report['specialties_added']} specialties, {report['insurance_links_added']} insurance links, "
+        f"{report['specialty_links_added']} specialty links"
+    )
+    for rejected in report['rejected']:
+        print(f"  {rejected['position']}: {rejected['error']}")
+    return report
+
 
 if __name__ == "__main__":
-    populate_database()
+    parser = argparse.ArgumentParser(description="Load a payer directory .docx into medical.db")
+    parser.add_argument('path', nargs='?', default=DEFAULT_PATH)
+    parser.add_argument('--chunk-size', type=int, default=500, help="rows per transaction")
+    args = parser.parse_args()
+    populate_database(args.path, args.chunk_size)
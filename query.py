@@ -0,0 +1,109 @@
+import threading
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+
+class Criteria(NamedTuple):
+    """What a verify query asks for; unset fields are None."""
+    insurance: Optional[str] = None
+    doctor: Optional[str] = None
+    specialty: Optional[str] = None
+
+    @classmethod
+    def from_args(cls, args, suffix='_query'):
+        # Empty form fields mean "not given", and must share a cache entry with
+        # missing ones
+        return cls(**{field: args.get(field + suffix) or None for field in cls._fields})
+
+    def __bool__(self):
+        return any(self)
+
+
+class QueryEngine:
+    """Answers verify queries from the directory indexes.
+
+    Criteria combine with AND: "Cardiology (Heart)" and "Healthfirst" gives
+    the cardiologists who take Healthfirst. The verify pages and the JSON API
+    all go through search(), so a lookup is implemented, and made fast, in
+    one place. Results are kept in an LRU keyed on the criteria and dropped
+    when the directory version changes.
+    """
+
+    def __init__(self, directory, maxsize=1024):
+        self._directory = directory
+        self.maxsize = maxsize
+        self._results = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def normalize(self, criteria):
+        """criteria with the specialty given by alias or id replaced by its name."""
+        if not criteria.specialty:
+            return criteria
+        return criteria._replace(specialty=self._directory.index().taxonomy.resolve(criteria.specialty))
+
+    def search(self, criteria):
+        """Return the match dicts meeting every given criterion, in directory order."""
+        # Version first: if the directory reloads in between, newer results are
+        # at worst cached under the old version, never stale ones under the new
+        version = self._directory.current_version()
+        index = self._directory.index()
+        criteria = self.normalize(criteria)
+        with self._lock:
+            if version != self._version:
+                self._results.clear()
+                self._version = version
+            results = self._results.get(criteria)
+            if results is not None:
+                self._results.move_to_end(criteria)
+                self.hits += 1
+                return results
+            self.misses += 1
+
+        results = self._lookup(index, criteria)
+        with self._lock:
+            if version == self._version:
+                self._results[criteria] = results
+                while len(self._results) > self.maxsize:
+                    self._results.popitem(last=False)
+        return results
+
+    def _lookup(self, index, criteria):
+        # Walk the smallest posting list and test its rows against the other
+        # criteria, so the cost follows the most selective criterion rather
+        # than the size of the directory
+        given = [(field, value) for field, value in zip(Criteria._fields, criteria) if value]
+        if not given:
+            return []
+        # A specialty may be spelled more than one way in the data
+        members = index.taxonomy.members(criteria.specialty) if criteria.specialty else ()
+        if len(given) == 1 and len(members) < 2:
+            field, value = given[0]
+            return getattr(index, 'by_' + field).get(value, [])
+
+        def rows(field, value):
+            if field == 'specialty' and len(members) > 1:
+                return sorted({row for member in members for row in index.rows(field, member)})
+            return index.rows(field, value)
+
+        def has(row, field, value):
+            if field == 'specialty':
+                return any(index.row_has(row, field, member) for member in members)
+            return index.row_has(row, field, value)
+
+        postings = sorted(((rows(field, value), field, value) for field, value in given), key=lambda p: len(p[0]))
+        smallest, _, _ = postings[0]
+        others = [(field, value) for _, field, value in postings[1:]]
+        return [
+            index.match(row) for row in smallest
+            if all(has(row, field, value) for field, value in others)
+        ]
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+
+    def stats(self):
+        return {'entries': len(self._results), 'maxsize': self.maxsize, 'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,83 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+from flask import make_response, request
+
+from compression import Encoded, respond
+
+
+class ResponseCache:
+    """Bounded LRU of rendered pages.
+
+    Entries are keyed on (endpoint, view args, normalized query args, data
+    version), so a page is rendered once per directory version. Responses get
+    a strong ETag and conditional GETs are answered with a 304 straight from
+    the cache.
+    """
+
+    def __init__(self, maxsize=256, max_age=0):
+        self.maxsize = maxsize
+        self.max_age = max_age
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {
+            'entries': len(self._entries),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+    def cached(self, version):
+        """Cache a GET view whose output depends only on its args and version()."""
+        def decorator(f):
+            @wraps(f)
+            def decorated(*args, **kwargs):
+                # Empty values behave like missing ones in the views, so drop them
+                query_args = tuple(sorted(
+                    ((k, v) for k, v in request.args.items(multi=True) if v),
+                    key=lambda kv: kv[0]
+                ))
+                key = (request.endpoint, tuple(sorted(kwargs.items())), query_args, version())
+                entry = self.get(key)
+                if entry is None:
+                    response = make_response(f(*args, **kwargs))
+                    if response.status_code != 200:
+                        return response
+                    body = response.get_data()
+                    entry = (Encoded(body, response.content_type), hashlib.sha1(body).hexdigest())
+                    self.put(key, entry)
+
+                response = respond(*entry)
+                response.cache_control.public = True
+                response.cache_control.max_age = self.max_age
+                response.cache_control.must_revalidate = True
+                return response
+            return decorated
+        return decorator
@@ -0,0 +1,193 @@
+import codecs
+import csv
+import io
+import re
+from zipfile import BadZipFile
+
+# Accepted header names for each roster column, compared case-insensitively
+COLUMNS = {
+    'doctor': ('doctor', 'provider', 'doctor name', 'provider name', 'name'),
+    'insurance': ('insurance', 'insurances', 'plan', 'plans', 'payer'),
+    'specialty': ('specialty', 'specialties', 'speciality'),
+}
+
+# CSV encodings tried in order; cp1252 is what Excel on Windows saves as "CSV"
+ENCODINGS = ('utf-8-sig', 'cp1252')
+
+# Longest doctor/insurance/specialty name the name columns hold
+MAX_NAME = 100
+
+# Multi-valued insurance/specialty cells use ';' or ',' between values
+_SEPARATOR = re.compile(r'\s*[;,]\s*')
+
+
+class RosterError(ValueError):
+    pass
+
+
+def split_values(cell):
+    return [value for value in _SEPARATOR.split(cell.strip()) if value] if cell else []
+
+
+def map_header(header):
+    """Return {column: position} for a roster header row."""
+    positions = {}
+    for position, title in enumerate(header):
+        title = (title or '').strip().lower()
+        for column, titles in COLUMNS.items():
+            if title in titles and column not in positions:
+                positions[column] = position
+    if 'doctor' not in positions:
+        raise RosterError("Roster needs a doctor/provider column")
+    return positions
+
+
+def detect_encoding(stream, block_size=1 << 16):
+    """Return the first of ENCODINGS that decodes all of a seekable stream.
+
+    The whole file is checked up front, so a bad byte near the end is a
+    RosterError before the first chunk is committed, not halfway through.
+    """
+    start = stream.tell()
+    try:
+        for encoding in ENCODINGS:
+            stream.seek(start)
+            decoder = codecs.getincrementaldecoder(encoding)()
+            try:
+                while True:
+                    block = stream.read(block_size)
+                    decoder.decode(block, final=not block)
+                    if not block:
+                        return encoding
+            except UnicodeDecodeError:
+                continue
+    finally:
+        stream.seek(start)
+    raise RosterError("Roster isn't UTF-8 or Windows-1252 text; save it as \"CSV UTF-8\"")
+
+
+def _csv_rows(stream):
+    if isinstance(stream, (bytes, bytearray)):
+        stream = io.BytesIO(stream)
+    if not isinstance(stream, io.TextIOBase):
+        if not stream.seekable():
+            stream = io.BytesIO(stream.read())
+        stream = io.TextIOWrapper(stream, encoding=detect_encoding(stream), newline='')
+    return csv.reader(stream)
+
+
+def _xlsx_rows(stream):
+    # Only needed for spreadsheet rosters
+    from openpyxl import load_workbook
+    from openpyxl.utils.exceptions import InvalidFileException
+
+    try:
+        workbook = load_workbook(stream, read_only=True, data_only=True)
+    except (BadZipFile, InvalidFileException, KeyError) as e:
+        raise RosterError(f"Not a readable .xlsx workbook: {e}")
+    for row in workbook.active.iter_rows(values_only=True):
+        yield ['' if cell is None else str(cell) for cell in row]
+
+
+def iter_roster(stream, filename):
+    """Yield (line number, record, error) for each data row of a CSV/XLSX roster.
+
+    A record is {'doctor', 'insurances', 'specialties'}, the last two None when
+    the roster has no such column; rows that can't be used
+    come back with record None and the reason in error. Rows are read lazily,
+    so a roster of any size is processed in constant memory.
+    """
+    if filename.lower().endswith(('.xlsx', '.xlsm')):
+        rows = _xlsx_rows(stream)
+    elif filename.lower().endswith(('.csv', '.txt')):
+        rows = _csv_rows(stream)
+    else:
+        raise RosterError(f"Unsupported roster file {filename!r}; use .csv or .xlsx")
+
+    rows = iter(rows)
+    header = next(rows, None)
+    if header is None:
+        raise RosterError("Roster is empty")
+    positions = map_header(header)
+
+    def cell(row, column):
+        position = positions.get(column)
+        return row[position].strip() if position is not None and position < len(row) and row[position] else ''
+
+    for line, row in enumerate(rows, 2):
+        if not any(value.strip() for value in row):
+            continue
+        # A column the roster doesn't have is None, so a sync leaves it alone
+        record = {
+            'doctor': cell(row, 'doctor'),
+            'insurances': split_values(cell(row, 'insurance')) if 'insurance' in positions else None,
+            'specialties': split_values(cell(row, 'specialty')) if 'specialty' in positions else None,
+        }
+        error = record_error(record)
+        yield line, None if error else record, error
+
+
+def record_error(record):
+    """Why a roster record can't be stored, or None if it can."""
+    if not record['doctor']:
+        return "missing doctor"
+    if len(record['doctor']) > MAX_NAME:
+        return f"doctor name longer than {MAX_NAME} characters"
+    if any(len(name) > MAX_NAME for name in (record['insurances'] or []) + (record['specialties'] or [])):
+        return f"insurance/specialty name longer than {MAX_NAME} characters"
+    return None
+
+
+def diff_roster(current, records, insurance=None):
+    """Compare roster records against the current directory.
+
+    current maps doctor -> (set of insurances, set of specialties). Without
+    insurance the roster is the whole directory: doctors missing from it are
+    deleted and each doctor's links are made to match exactly. With insurance
+    it is one payer's roster: only that plan's links are added/removed, and
+    specialties are only ever added.
+    Returns lists of names / (doctor, name) pairs to insert and delete.
+    """
+    desired = {}
+    # Only columns present in the roster are compared; links are never
+    # removed because a column is missing
+    sync_insurances = not insurance
+    sync_specialties = True
+    for record in records:
+        insurances, specialties = desired.setdefault(record['doctor'], (set(), set()))
+        if insurance:
+            insurances.add(insurance)
+        elif record['insurances'] is None:
+            sync_insurances = False
+        else:
+            insurances.update(record['insurances'])
+        if record['specialties'] is None:
+            sync_specialties = False
+        else:
+            specialties.update(record['specialties'])
+
+    diff = {
+        'add_doctors': [], 'delete_doctors': [],
+        'link_insurances': [], 'unlink_insurances': [],
+        'link_specialties': [], 'unlink_specialties': [],
+    }
+    for doctor, (insurances, specialties) in desired.items():
+        have_insurances, have_specialties = current.get(doctor, (set(), set()))
+        if doctor not in current:
+            diff['add_doctors'].append(doctor)
+        diff['link_insurances'].extend((doctor, name) for name in insurances - have_insurances)
+        diff['link_specialties'].extend((doctor, name) for name in specialties - have_specialties)
+        if sync_insurances:
+            diff['unlink_insurances'].extend((doctor, name) for name in have_insurances - insurances)
+        if sync_specialties and not insurance:
+            diff['unlink_specialties'].extend((doctor, name) for name in have_specialties - specialties)
+
+    for doctor, (have_insurances, _) in current.items():
+        if doctor in desired:
+            continue
+        if insurance:
+            if insurance in have_insurances:
+                diff['unlink_insurances'].append((doctor, insurance))
+        else:
+            diff['delete_doctors'].append(doctor)
+    return diff
@@ -0,0 +1,214 @@
+import heapq
+import re
+import unicodedata
+from bisect import bisect_left
+from collections import Counter
+from itertools import chain
+
+_WORD = re.compile(r'[a-z0-9]+')
+
+# Match quality of one query word against one name word
+EXACT, PREFIX, FUZZY = 3, 2, 1
+
+
+def words(text):
+    """Lowercased, accent-free words of text ("Dr. José Krinsky, MD" -> dr jose krinsky md)."""
+    text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii')
+    return _WORD.findall(text.lower())
+
+
+def trigrams(word):
+    padded = f'${word}$'
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def max_edits(word):
+    return 0 if len(word) < 4 else 1 if len(word) < 7 else 2
+
+
+def edit_distance(a, b, limit):
+    """Edit distance counting a swap of neighbours as one edit; limit + 1 once over limit.
+
+    Only cells within limit of the diagonal can stay under limit, so only
+    those are computed.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    over = limit + 1
+    previous2 = None
+    previous = [j if j <= limit else over for j in range(len(b) + 1)]
+    for i, ca in enumerate(a, 1):
+        current = [over] * (len(b) + 1)
+        if i <= limit:
+            current[0] = i
+        for j in range(max(1, i - limit), min(len(b), i + limit) + 1):
+            cb = b[j - 1]
+            cost = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb))
+            if i > 1 and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                cost = min(cost, previous2[j - 2] + 1)
+            current[j] = min(cost, over)
+        if min(current) > limit:
+            return over
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+class TypeaheadIndex:
+    """Prefix and typo-tolerant lookup over doctor, plan and specialty names.
+
+    Every word of every name goes into a sorted word list, for prefix
+    matches by binary search, and a trigram index, for words a typo or two
+    away ("krinksy" finds Krinsky). Entries are numbered shortest name
+    first, so posting lists are already in result order. A query expands
+    its most selective word, stopping once enough results are in hand, and
+    checks the other words against those entries only; words every doctor
+    has ("Dr", "MD") only add to the score. A query never walks the whole
+    roster.
+    """
+
+    # Fuzzy candidates checked with a real edit distance per query word
+    FUZZY_CANDIDATES = 32
+    # Entries the most selective word may expand to when other words still
+    # have to be checked; beyond this, later (longer) names are cut
+    MAX_EXPANSION = 500
+    # Prefixes up to this long can expand to thousands of words, so their
+    # combined posting lists are built up front
+    SHORT_PREFIX = 2
+    # Titles and credentials nearly every doctor's name has
+    FILLER = ('dr', 'md', 'do', 'dpm', 'np', 'fnp', 'pa', 'phd', 'rn', 'mr', 'mrs', 'ms')
+
+    def __init__(self, names):
+        # names: iterable of (kind, name)
+        self.entries = sorted(dict.fromkeys(names), key=lambda entry: (len(entry[1]), entry[1]))
+        self._entry_words = []
+        postings = {}
+        for entry_id, (_, name) in enumerate(self.entries):
+            name_words = tuple(dict.fromkeys(words(name)))
+            self._entry_words.append(name_words)
+            for word in name_words:
+                postings.setdefault(word, []).append(entry_id)
+        self._words = sorted(postings)
+        self._postings = postings
+        short = {}
+        for word, entry_ids in postings.items():
+            for length in range(1, min(len(word), self.SHORT_PREFIX) + 1):
+                short.setdefault(word[:length], set()).update(entry_ids)
+        self._short = {prefix: sorted(entry_ids) for prefix, entry_ids in short.items()}
+        self._grams = {}
+        for word in self._words:
+            for gram in trigrams(word):
+                self._grams.setdefault(gram, []).append(word)
+
+    def _prefixed(self, prefix):
+        words = self._words
+        for position in range(bisect_left(words, prefix), len(words)):
+            if not words[position].startswith(prefix):
+                break
+            yield words[position]
+
+    def _fuzzy(self, word):
+        limit = max_edits(word)
+        if not limit:
+            return
+        grams = trigrams(word)
+        shared = Counter(chain.from_iterable(self._grams.get(gram, ()) for gram in grams))
+        # Each edit changes at most four trigrams (a swap), and a half-typed
+        # word loses its closing one; sharing fewer means too many edits away
+        least = len(grams) - 4 * limit - 1
+        for candidate, count in shared.most_common(self.FUZZY_CANDIDATES):
+            if count < least:
+                break
+            # The word may still be half typed, so also compare to the same-length prefix
+            if (edit_distance(word, candidate, limit) <= limit
+                    or len(candidate) > len(word) and edit_distance(word, candidate[:len(word)], limit) <= limit):
+                yield candidate
+
+    def _is_filler(self, word):
+        return any(filler.startswith(word) for filler in self.FILLER)
+
+    def _expand(self, word):
+        """Posting lists for a query word, grouped (exact, prefix, fuzzy), and its fuzzy-only words."""
+        exact = self._postings.get(word)
+        if len(word) <= self.SHORT_PREFIX:
+            prefix = [self._short.get(word, [])]
+        else:
+            prefix = [self._postings[candidate] for candidate in self._prefixed(word) if candidate != word]
+        fuzzy = [candidate for candidate in self._fuzzy(word) if not candidate.startswith(word)]
+        groups = ([exact] if exact else [], prefix, [self._postings[candidate] for candidate in fuzzy])
+        return groups, set(fuzzy)
+
+    @staticmethod
+    def _size(groups):
+        return sum(len(postings) for group in groups for postings in group)
+
+    def _ranked(self, groups, kinds):
+        """Yield (entry id, quality) for a query word, best quality then shortest name first."""
+        seen = set()
+        for quality, group in zip((EXACT, PREFIX, FUZZY), groups):
+            # A lazy merge stops early on a few long lists; many short ones
+            # are cheaper to sort in one go
+            merged = heapq.merge(*group) if len(group) <= 16 else sorted(set(chain.from_iterable(group)))
+            for entry_id in merged:
+                if entry_id in seen:
+                    continue
+                seen.add(entry_id)
+                if kinds and self.entries[entry_id][0] not in kinds:
+                    continue
+                yield entry_id, quality
+
+    def _quality(self, entry_id, word, fuzzy):
+        best = 0
+        for name_word in self._entry_words[entry_id]:
+            if name_word == word:
+                return EXACT
+            if name_word.startswith(word):
+                best = PREFIX
+            elif not best and name_word in fuzzy:
+                best = FUZZY
+        return best
+
+    def search(self, query, limit=10, kinds=None):
+        """Return up to limit {'kind', 'name', 'score'} matches, best first.
+
+        Every query word has to match some word of the name, exactly, as a
+        prefix or within a typo or two; titles and credentials only have to
+        when the query has nothing else.
+        """
+        query_words = list(dict.fromkeys(words(query)))
+        if not query_words:
+            return []
+        expansions = {word: self._expand(word) for word in query_words}
+        sizes = {word: self._size(expansions[word][0]) for word in query_words}
+        required = [word for word in query_words if not self._is_filler(word)] or query_words
+        required.sort(key=sizes.get)
+        driver, others = required[0], required[1:]
+        bonus = [word for word in query_words if word not in required]
+        checks = [(word, expansions[word][1]) for word in others + bonus]
+        # Entries each other required word matches, where that's cheap to
+        # collect, so most misses cost a set lookup
+        members = [
+            set(chain.from_iterable(chain.from_iterable(expansions[word][0])))
+            for word in others if sizes[word] <= 8 * sizes[driver] + 1000
+        ]
+
+        # One word: the ranked expansion is already the answer
+        stop = limit if not checks else self.MAX_EXPANSION
+        scores = {}
+        for entry_id, quality in self._ranked(expansions[driver][0], kinds):
+            if len(scores) >= stop:
+                break
+            if not all(entry_id in member_ids for member_ids in members):
+                continue
+            score = quality
+            for position, (word, fuzzy) in enumerate(checks):
+                extra = self._quality(entry_id, word, fuzzy)
+                if position < len(others) and not extra:
+                    break
+                score += extra
+            else:
+                scores[entry_id] = score
+        best = heapq.nsmallest(limit, scores.items(), key=lambda item: (-item[1], item[0]))
+        return [
+            {'kind': self.entries[entry_id][0], 'name': self.entries[entry_id][1], 'score': score}
+            for entry_id, score in best
+        ]
@@ -0,0 +1,121 @@
+import secrets
+import sqlite3
+import threading
+import time
+
+
+def new_token():
+    # 256 random bits: unguessable, so the cookie needs no signature
+    return secrets.token_urlsafe(32)
+
+
+class MemorySessionStore:
+    """Login sessions kept in this process, with sliding expiration.
+
+    A session expires ttl seconds after it was last used. Only suitable for a
+    single worker: other processes don't see these sessions.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._expires = {}
+        self._lock = threading.Lock()
+
+    def create(self):
+        token = new_token()
+        now = time.time()
+        with self._lock:
+            self._expires = {t: e for t, e in self._expires.items() if e > now}
+            self._expires[token] = now + self.ttl
+        return token
+
+    def touch(self, token):
+        """Return whether token is a live session, extending it if so."""
+        if not token:
+            return False
+        now = time.time()
+        with self._lock:
+            expires = self._expires.get(token)
+            if expires is None or expires <= now:
+                self._expires.pop(token, None)
+                return False
+            self._expires[token] = now + self.ttl
+        return True
+
+    def revoke(self, token):
+        with self._lock:
+            self._expires.pop(token, None)
+
+    def revoke_all(self):
+        with self._lock:
+            count = len(self._expires)
+            self._expires.clear()
+        return count
+
+    def count(self):
+        now = time.time()
+        return sum(expires > now for expires in list(self._expires.values()))
+
+
+class SQLiteSessionStore:
+    """Login sessions in their own SQLite file, shared by every worker.
+
+    Kept out of the directory database so logins and session refreshes never
+    bump the directory version. A check is one primary-key lookup; the expiry
+    is only rewritten once refresh seconds have passed since the last write,
+    so a burst of requests costs reads, not writes.
+    """
+
+    def __init__(self, path, ttl, refresh=None):
+        self.path = path
+        self.ttl = ttl
+        self.refresh = ttl / 10 if refresh is None else refresh
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS auth_session ('
+                ' token TEXT PRIMARY KEY, created REAL NOT NULL, expires REAL NOT NULL)'
+            )
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_auth_session_expires ON auth_session (expires)')
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute('PRAGMA journal_mode=WAL')
+        return conn
+
+    def create(self):
+        token = new_token()
+        now = time.time()
+        with self._connection() as conn:
+            conn.execute('DELETE FROM auth_session WHERE expires <= ?', (now,))
+            conn.execute('INSERT INTO auth_session VALUES (?, ?, ?)', (token, now, now + self.ttl))
+        return token
+
+    def touch(self, token):
+        """Return whether token is a live session, extending it if so."""
+        if not token:
+            return False
+        now = time.time()
+        conn = self._connection()
+        row = conn.execute('SELECT expires FROM auth_session WHERE token = ?', (token,)).fetchone()
+        if row is None or row[0] <= now:
+            return False
+        if now + self.ttl - row[0] >= self.refresh:
+            with conn:
+                conn.execute('UPDATE auth_session SET expires = ? WHERE token = ?', (now + self.ttl, token))
+        return True
+
+    def revoke(self, token):
+        with self._connection() as conn:
+            conn.execute('DELETE FROM auth_session WHERE token = ?', (token,))
+
+    def revoke_all(self):
+        with self._connection() as conn:
+            return conn.execute('DELETE FROM auth_session').rowcount
+
+    def count(self):
+        return self._connection().execute(
+            'SELECT COUNT(*) FROM auth_session WHERE expires > ?', (time.time(),)
+        ).fetchone()[0]
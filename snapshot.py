@@ -0,0 +1,327 @@
+import mmap
+import struct
+import sys
+from array import array
+from collections.abc import Mapping, Sequence
+from functools import cached_property
+
+from directory import DirectoryIndex
+from storage import atomic_write
+
+MAGIC = b'FMCSNAP\0'
+FORMAT_VERSION = 2
+
+# magic, format version, little-endian flag, source signature
+# (mtime_ns, size, change counter), section count, journal offset
+HEADER = struct.Struct('<8sIIqqIIq')
+# offset and byte length of one section
+SECTION = struct.Struct('<QQ')
+
+# Everything except string_data is an array of native uint32. The *_keys
+# sections hold (key string id, postings start, postings end) triples sorted by
+# the key's UTF-8 bytes; rows hold (name, specialty, insurances start/end,
+# specialties start/end) per directory entry, the ranges pointing into pool.
+SECTIONS = (
+    'string_offsets', 'string_data', 'rows', 'pool', 'postings',
+    'doctor_keys', 'insurance_keys', 'specialty_keys',
+    'doctor_order', 'insurance_order', 'all_insurances', 'all_specialties',
+)
+ROW_WIDTH = 6
+
+
+def _split(specialty):
+    return specialty.split(', ') if specialty else []
+
+
+def write_snapshot(path, data, signature, journal_offset=0):
+    """Write data (as returned by load_directory) and its lookup indexes to path.
+
+    signature is the (mtime_ns, size, change counter) of the database the data
+    was read from; workers only attach to a snapshot whose signature matches
+    the database they see. journal_offset is how far into the change journal
+    the data reaches, so a replica can load the snapshot and tail from there.
+    """
+    string_ids = {}
+
+    def sid(text):
+        if text not in string_ids:
+            string_ids[text] = len(string_ids)
+        return string_ids[text]
+
+    rows = array('I')
+    pool = array('I')
+    postings = {'doctor': {}, 'insurance': {}, 'specialty': {}}
+    for row, entry in enumerate(data['doctors_specialties']):
+        insurances = entry.get('insurances', [])
+        specs = _split(entry['specialty'])
+        ins_start = len(pool)
+        pool.extend(sid(name) for name in insurances)
+        spec_start = len(pool)
+        pool.extend(sid(name) for name in specs)
+        rows.extend((sid(entry['doctor']), sid(entry['specialty']), ins_start, spec_start, spec_start, len(pool)))
+
+        postings['doctor'].setdefault(entry['doctor'], []).append(row)
+        for name in dict.fromkeys(insurances):
+            postings['insurance'].setdefault(name, []).append(row)
+        for name in dict.fromkeys(specs):
+            postings['specialty'].setdefault(name, []).append(row)
+
+    posting_pool = array('I')
+    sections = {}
+    for kind, by_key in postings.items():
+        keys = array('I')
+        for name in sorted(by_key, key=lambda name: name.encode('utf-8')):
+            keys.extend((sid(name), len(posting_pool), len(posting_pool) + len(by_key[name])))
+            posting_pool.extend(by_key[name])
+        sections[kind + '_keys'] = keys
+    sections['doctor_order'] = array('I', (sid(name) for name in postings['doctor']))
+    sections['insurance_order'] = array('I', (sid(name) for name in postings['insurance']))
+    sections['all_insurances'] = array('I', (sid(name) for name in data['insurances']))
+    sections['all_specialties'] = array('I', (sid(name) for name in data['specialties']))
+    sections['rows'] = rows
+    sections['pool'] = pool
+    sections['postings'] = posting_pool
+
+    string_data = bytearray()
+    string_offsets = array('I', [0])
+    for text in string_ids:
+        string_data += text.encode('utf-8')
+        string_offsets.append(len(string_data))
+    sections['string_offsets'] = string_offsets
+    sections['string_data'] = bytes(string_data)
+
+    blobs = [
+        sections[name] if name == 'string_data' else sections[name].tobytes()
+        for name in SECTIONS
+    ]
+
+    def write(f):
+        offset = HEADER.size + SECTION.size * len(SECTIONS)
+        table = []
+        for blob in blobs:
+            offset += -offset % 8
+            table.append((offset, len(blob)))
+            offset += len(blob)
+        mtime_ns, size, counter = signature
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, sys.byteorder == 'little', mtime_ns, size, counter, len(SECTIONS), journal_offset))
+        for entry in table:
+            f.write(SECTION.pack(*entry))
+        position = HEADER.size + SECTION.size * len(SECTIONS)
+        for (offset, _), blob in zip(table, blobs):
+            f.write(b'\0' * (offset - position))
+            f.write(blob)
+            position = offset + len(blob)
+
+    atomic_write(path, write)
+
+
+class DirectorySnapshot:
+    """Read-only, memory-mapped view of a snapshot file.
+
+    The file is mapped rather than parsed, so attaching costs the same no
+    matter how large the roster is, and every worker shares the same pages
+    through the OS page cache. Strings and records are decoded on first use.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+        magic, version, little, mtime_ns, size, counter, count, journal_offset = HEADER.unpack_from(view)
+        if magic != MAGIC or version != FORMAT_VERSION or count != len(SECTIONS):
+            raise ValueError(f"{path} is not a version {FORMAT_VERSION} directory snapshot")
+        if bool(little) != (sys.byteorder == 'little'):
+            raise ValueError(f"{path} was written on a machine with a different byte order")
+        self.signature = (mtime_ns, size, counter)
+        self.journal_offset = journal_offset
+        for i, name in enumerate(SECTIONS):
+            offset, length = SECTION.unpack_from(view, HEADER.size + SECTION.size * i)
+            section = view[offset:offset + length]
+            setattr(self, name, section if name == 'string_data' else section.cast('I'))
+        self._strings = {}
+        self.data = SnapshotData(self)
+
+    @classmethod
+    def attach(cls, path, signature):
+        """Return the snapshot at path if it was built from signature, else None."""
+        try:
+            snapshot = cls(path)
+        except (OSError, ValueError, struct.error):
+            return None
+        return snapshot if snapshot.signature == tuple(signature) else None
+
+    def string(self, string_id):
+        text = self._strings.get(string_id)
+        if text is None:
+            start, end = self.string_offsets[string_id], self.string_offsets[string_id + 1]
+            text = self._strings[string_id] = str(self.string_data[start:end], 'utf-8')
+        return text
+
+    def strings(self, string_ids):
+        return [self.string(string_id) for string_id in string_ids]
+
+    def find(self, keys, name):
+        """Binary-search a *_keys section; return the postings slice or None."""
+        target = name.encode('utf-8')
+        offsets = self.string_offsets
+        lo, hi = 0, len(keys) // 3
+        while lo < hi:
+            mid = (lo + hi) // 2
+            string_id = keys[mid * 3]
+            key = self.string_data[offsets[string_id]:offsets[string_id + 1]].tobytes()
+            if key < target:
+                lo = mid + 1
+            elif key > target:
+                hi = mid
+            else:
+                return self.postings[keys[mid * 3 + 1]:keys[mid * 3 + 2]]
+        return None
+
+    def row(self, row):
+        return self.rows[row * ROW_WIDTH:(row + 1) * ROW_WIDTH]
+
+    def __len__(self):
+        return len(self.rows) // ROW_WIDTH
+
+
+class _Entries(Sequence):
+    """data['doctors_specialties'] decoded row by row."""
+
+    def __init__(self, snapshot):
+        self._snapshot = snapshot
+
+    def __len__(self):
+        return len(self._snapshot)
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [self[i] for i in range(*row.indices(len(self)))]
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError(row)
+        snapshot = self._snapshot
+        name, specialty, ins_start, ins_end, _, _ = snapshot.row(row)
+        return {
+            "doctor": snapshot.string(name),
+            "specialty": snapshot.string(specialty),
+            "insurances": snapshot.strings(snapshot.pool[ins_start:ins_end])
+        }
+
+
+class SnapshotData(Mapping):
+    """Stands in for the dict load_directory() returns."""
+
+    def __init__(self, snapshot):
+        self._snapshot = snapshot
+        self._values = {}
+
+    def __getitem__(self, key):
+        if key not in self._values:
+            snapshot = self._snapshot
+            if key == 'doctors_specialties':
+                self._values[key] = _Entries(snapshot)
+            elif key == 'insurances':
+                self._values[key] = snapshot.strings(snapshot.all_insurances)
+            elif key == 'specialties':
+                self._values[key] = snapshot.strings(snapshot.all_specialties)
+            else:
+                raise KeyError(key)
+        return self._values[key]
+
+    def __iter__(self):
+        return iter(('doctors_specialties', 'insurances', 'specialties'))
+
+    def __len__(self):
+        return 3
+
+    @cached_property
+    def prebuilt_index(self):
+        return SnapshotIndex(self._snapshot, self)
+
+
+class _Postings(Mapping):
+    """One of the by_* maps of a DirectoryIndex, answered from the snapshot."""
+
+    def __init__(self, snapshot, keys, order, match):
+        self._snapshot = snapshot
+        self._keys = keys
+        self._order = order
+        self._match = match
+
+    def __getitem__(self, name):
+        rows = self._snapshot.find(self._keys, name)
+        if rows is None:
+            raise KeyError(name)
+        return [self._match(row) for row in rows]
+
+    def __iter__(self):
+        return (self._snapshot.string(string_id) for string_id in self._order)
+
+    def __len__(self):
+        return len(self._order)
+
+
+class SnapshotIndex(DirectoryIndex):
+    """DirectoryIndex backed by the snapshot's prebuilt postings."""
+
+    def __init__(self, snapshot, data):
+        self.data = data
+        self._snapshot = snapshot
+        self._matches = {}
+        self._doctor_colors = {}
+        self.by_doctor = _Postings(snapshot, snapshot.doctor_keys, snapshot.doctor_order, self._match)
+        self.by_insurance = _Postings(snapshot, snapshot.insurance_keys, snapshot.insurance_order, self._match)
+        self.by_specialty = _Postings(snapshot, snapshot.specialty_keys, snapshot.specialty_keys[::3], self._match)
+
+    def _match(self, row):
+        match = self._matches.get(row)
+        if match is None:
+            snapshot = self._snapshot
+            name, specialty, ins_start, ins_end, _, _ = snapshot.row(row)
+            match = self._matches[row] = {
+                'name': snapshot.string(name),
+                'specialties': snapshot.string(specialty),
+                'insurances': ', '.join(snapshot.strings(snapshot.pool[ins_start:ins_end]))
+            }
+        return match
+
+    @cached_property
+    def doctors(self):
+        return self._snapshot.strings(self._snapshot.doctor_order)
+
+    @cached_property
+    def insurances(self):
+        return self._snapshot.strings(self._snapshot.insurance_order)
+
+    def rows(self, field, name):
+        keys = getattr(self._snapshot, field + '_keys')
+        return self._snapshot.find(keys, name) or ()
+
+    def row_has(self, row, field, name):
+        snapshot = self._snapshot
+        name_id, _, ins_start, ins_end, spec_start, spec_end = snapshot.row(row)
+        if field == 'doctor':
+            return snapshot.string(name_id) == name
+        if field == 'insurance':
+            return name in snapshot.strings(snapshot.pool[ins_start:ins_end])
+        return name in snapshot.strings(snapshot.pool[spec_start:spec_end])
+
+    def match(self, row):
+        return self._match(row)
+
+    def accepts(self, doctor, insurance):
+        snapshot = self._snapshot
+        for row in snapshot.find(snapshot.doctor_keys, doctor) or ():
+            _, _, ins_start, ins_end, _, _ = snapshot.row(row)
+            if insurance in snapshot.strings(snapshot.pool[ins_start:ins_end]):
+                return True
+        return False
+
+    def _doctor_specialty_lists(self):
+        snapshot = self._snapshot
+        lists = {}
+        for row in range(len(snapshot)):
+            name, _, _, _, spec_start, spec_end = snapshot.row(row)
+            lists.setdefault(snapshot.string(name), []).append(snapshot.strings(snapshot.pool[spec_start:spec_end]))
+        return lists.items()
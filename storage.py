@@ -0,0 +1,48 @@
+import fcntl
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+
+
+@contextmanager
+def file_lock(path):
+    """Hold an exclusive inter-process lock for writers of path.
+
+    The lock lives in a sidecar '<path>.lock' file so readers, which only
+    ever open path itself, never block on it.
+    """
+    with open(path + '.lock', 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def atomic_write(path, write):
+    """Call write(f) on a temp file and swap it in place of path.
+
+    os.replace() is atomic, so a concurrent reader sees either the old file or
+    the new one, never a half-written one.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    with file_lock(path):
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(path) + '.')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                write(f)
+                f.flush()
+                os.fsync(f.fileno())
+            try:
+                os.chmod(tmp_path, os.stat(path).st_mode & 0o777)
+            except FileNotFoundError:
+                os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+
+def atomic_write_json(path, data, **kwargs):
+    atomic_write(path, lambda f: f.write(json.dumps(data, **kwargs).encode('utf-8')))
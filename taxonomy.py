@@ -0,0 +1,107 @@
+import re
+from typing import NamedTuple
+
+# "Nephrology (Kidney)": the plain-language name in parentheses is an alias
+_PARENTHESIZED = re.compile(r'^(.*?)\s*\(([^()]*)\)\s*$')
+
+# Everyday words for a specialty beyond the one in its name, keyed on the id
+SYNONYMS = {
+    'cardiology': ('heart', 'cardiac', 'cardiologist'),
+    'dermatology': ('skin', 'dermatologist'),
+    'nephrology': ('kidney', 'kidneys', 'renal', 'nephrologist'),
+    'ophthalmology': ('eye', 'eyes', 'ophthalmologist'),
+    'podiatry': ('feet', 'foot', 'podiatrist'),
+    'vascular': ('veins', 'vein', 'vascular surgery'),
+    'gastroenterology': ('gi', 'stomach', 'digestive', 'gastroenterologist'),
+    'pediatrics': ('children', 'kids', 'paediatrics', 'pediatrician'),
+    'primary-care': ('pcp', 'general practice'),
+    'family-practice': ('family medicine',),
+    'urology': ('bladder', 'urologist'),
+}
+
+
+def normalize(text):
+    return ' '.join(text.casefold().split())
+
+
+def slug(text):
+    return re.sub(r'[^a-z0-9]+', '-', normalize(text)).strip('-')
+
+
+def split_name(name):
+    """'Nephrology (Kidney)' -> ('Nephrology', 'Kidney'); no parentheses -> (name, None)."""
+    match = _PARENTHESIZED.match(name)
+    return (match.group(1), match.group(2)) if match else (name, None)
+
+
+class Specialty(NamedTuple):
+    id: str
+    name: str
+    aliases: tuple
+    members: tuple
+    doctors: int
+
+
+class SpecialtyTaxonomy:
+    """The specialties in the directory, normalized.
+
+    Spellings that only differ in case, spacing or the parenthesized part
+    ("Podiatry (feet)", "podiatry") are one specialty. Its name is the
+    spelling most doctors have, and its id is a slug of the name outside the
+    parentheses, so it stays the same across directory versions and renames
+    of the plain-language part. The parenthesized words, the other
+    spellings and SYNONYMS are aliases, so "Kidney" resolves to Nephrology.
+    """
+
+    def __init__(self, names, doctor_counts):
+        groups = {}
+        for name in names:
+            if name:
+                groups.setdefault(slug(split_name(name)[0]), []).append(name)
+
+        self.specialties = []
+        self._by_alias = {}
+        self._by_id = {}
+        self._by_name = {}
+        for specialty_id, members in groups.items():
+            members = tuple(dict.fromkeys(members))
+            name = max(members, key=lambda member: doctor_counts.get(member, 0))
+            aliases = {}
+            for member in members:
+                base, plain = split_name(member)
+                for alias in (member, base, plain):
+                    if alias:
+                        aliases[normalize(alias)] = None
+            aliases.update(dict.fromkeys(SYNONYMS.get(specialty_id, ())))
+            specialty = Specialty(
+                id=specialty_id,
+                name=name,
+                aliases=tuple(alias for alias in aliases if alias != normalize(name)),
+                members=members,
+                doctors=sum(doctor_counts.get(member, 0) for member in members)
+            )
+            self.specialties.append(specialty)
+            self._by_id[specialty_id] = specialty
+            for member in members:
+                self._by_name[member] = specialty
+            for alias in aliases:
+                self._by_alias.setdefault(alias, specialty)
+
+        # Most common first, so the busiest specialties lead the button grids
+        self.specialties.sort(key=lambda specialty: (-specialty.doctors, normalize(specialty.name)))
+        self.names = [specialty.name for specialty in self.specialties]
+
+    def lookup(self, text):
+        """The Specialty for a name, alias or id, or None."""
+        if not text:
+            return None
+        return self._by_name.get(text) or self._by_alias.get(normalize(text)) or self._by_id.get(text)
+
+    def resolve(self, text):
+        """Canonical name for text, or text itself if it isn't a known specialty."""
+        specialty = self.lookup(text)
+        return specialty.name if specialty else text
+
+    def members(self, name):
+        specialty = self._by_name.get(name)
+        return specialty.members if specialty else (name,)
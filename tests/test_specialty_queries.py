@@ -0,0 +1,59 @@
+import os
+import tempfile
+
+# main configures itself from the environment at import time
+_workdir = tempfile.mkdtemp(prefix='fmc-test-')
+os.environ.update(
+    DATABASE_URL='sqlite:///' + os.path.join(_workdir, 'medical.db'),
+    DIRECTORY_SNAPSHOT='',
+    DIRECTORY_JOURNAL='',
+    AUTH_SESSION_BACKEND='memory',
+)
+
+import main  # noqa: E402
+from main import Doctor, DoctorInsurance, DoctorSpecialty, Insurance, Specialty, app, db  # noqa: E402
+
+
+def add_urologists(count, start):
+    """Add count doctors in Urology, each taking two plans."""
+    with app.app_context():
+        names = [f'Dr. Test {i}, MD' for i in range(start, start + count)]
+        doctor_ids = main.get_or_create_ids(Doctor, names)
+        specialty_id = main.get_or_create_ids(Specialty, ['Urology'])['Urology']
+        plan_ids = main.get_or_create_ids(Insurance, ['Test Plan A', 'Test Plan B'])
+        main.insert_links(DoctorSpecialty, 'specialty_id', [(doctor_ids[name], specialty_id) for name in names])
+        main.insert_links(DoctorInsurance, 'insurance_id', [
+            (doctor_ids[name], plan_id) for name in names for plan_id in plan_ids.values()
+        ])
+        db.session.commit()
+
+
+def specialty_queries(client):
+    """Number of SQL statements one uncached GET /specialty/Urology runs."""
+    main.page_cache.clear()
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    with app.app_context():
+        engine = db.engine
+    db.event.listen(engine, 'before_cursor_execute', count)
+    try:
+        response = client.get('/specialty/Urology')
+    finally:
+        db.event.remove(engine, 'before_cursor_execute', count)
+    assert response.status_code == 200
+    return len(statements), len(response.get_json())
+
+
+def test_specialty_query_count_is_constant():
+    client = app.test_client()
+    # Either side of the 500 keys SQLAlchemy puts in one IN batch
+    add_urologists(100, 0)
+    small, small_doctors = specialty_queries(client)
+    add_urologists(1100, 100)
+    large, large_doctors = specialty_queries(client)
+
+    assert large_doctors - small_doctors == 1100
+    assert small == large